@@ -0,0 +1,88 @@
+# api/cache.py
+# In-process TTL + LRU cache for API responses. Entries are keyed on the route, its
+# normalized query parameters and the products data version (common/version.py), so a
+# scraper write makes every older entry unreachable without explicit invalidation.
+
+import os, json, time, hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from common.version import get_version
+from api.metrics import db_time, note_cache, note_docs, serialize_time
+
+CACHE_SIZE  = int(os.getenv("API_CACHE_SIZE", "512"))
+CACHE_TTL   = float(os.getenv("API_CACHE_TTL", "60"))
+# How stale the data version may be: at most one Mongo read per this interval.
+VERSION_TTL = float(os.getenv("API_CACHE_VERSION_TTL", "1"))
+
+class TTLCache:
+    """LRU dict whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+cache = TTLCache()
+_version = {"v": None, "checked": 0.0}
+
+async def data_version() -> int:
+    now = time.monotonic()
+    if _version["v"] is None or now - _version["checked"] >= VERSION_TTL:
+        async with db_time("version"):
+            _version["v"] = await get_version()
+        _version["checked"] = now
+    return _version["v"]
+
+def cache_key(path: str, params: Dict, version: int) -> str:
+    norm = {k: v for k, v in sorted(params.items()) if v not in (None, "")}
+    raw = json.dumps([path, norm, version], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+async def _encode(payload: Dict) -> bytes:
+    note_docs(payload.get("count", 0))
+    async with serialize_time():
+        return json.dumps(jsonable_encoder(payload)).encode()
+
+async def cached_json(request: Request, params: Dict, produce: Callable[[], Awaitable[Dict]]) -> Response:
+    """Serve `produce()` through the cache, with ETag / If-None-Match revalidation.
+
+    The ETag only depends on the query and the data version, so a matching
+    If-None-Match is answered with 304 before anything is computed.
+    """
+    if CACHE_SIZE <= 0:
+        return Response(await _encode(await produce()), media_type="application/json")
+    key = cache_key(request.url.path, params, await data_version())
+    etag = f'W/"{key[:20]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        note_cache("304")
+        return Response(status_code=304, headers=headers)
+    body: Optional[bytes] = cache.get(key)
+    headers["X-Cache"] = "HIT" if body is not None else "MISS"
+    note_cache(headers["X-Cache"])
+    if body is None:
+        body = await _encode(await produce())
+        cache.set(key, body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,128 @@
+# api/metrics.py
+# Request instrumentation for the API, exposed at /metrics in the Prometheus text format:
+#   - latency per route template, method and status,
+#   - time spent waiting on Mongo vs serializing the response, per route,
+#   - documents returned and cache HIT/MISS/304 per route.
+# Handlers report Mongo work through `db_time(...)`; a per-request context (contextvar)
+# collects it. With API_SLOW_MS > 0, requests slower than that are logged as JSON lines
+# (API_SLOW_LOG: a path, or "-" for stderr) with each Mongo filter and its explain() summary.
+
+import os, time, asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from fastapi import Request
+from starlette.routing import Match
+from common.metrics import Registry, JsonLog
+from common.indexes import plan_stages
+
+SLOW_MS  = float(os.getenv("API_SLOW_MS", "0"))          # 0 = slow-query log off
+SLOW_LOG = os.getenv("API_SLOW_LOG", "-")
+
+registry = Registry()
+REQUEST_SECONDS   = registry.histogram("api_request_seconds", "Request latency by route, method and status.")
+DB_SECONDS        = registry.histogram("api_db_seconds", "Time spent awaiting Mongo, by route and operation.")
+SERIALIZE_SECONDS = registry.histogram("api_serialize_seconds", "Time spent encoding JSON responses, by route.")
+DOCS_RETURNED     = registry.histogram("api_documents_returned", "Documents per response, by route.",
+                                       buckets=(0, 1, 5, 10, 25, 50, 100, 500))
+CACHE_TOTAL       = registry.counter("api_cache_total", "Response cache lookups by route and result.")
+
+slow_log = JsonLog(SLOW_LOG if SLOW_MS > 0 else "")
+_ctx: ContextVar[Optional[Dict]] = ContextVar("api_request_metrics", default=None)
+_explains = set()   # background explain() tasks, kept referenced until done
+
+def _current() -> Dict:
+    return _ctx.get() or {"route": "-", "queries": []}
+
+@asynccontextmanager
+async def db_time(op: str, col=None, filter: Optional[Dict] = None, sort=None, limit: int = 0):
+    """Time one awaited Mongo call for the current request (and remember it for the slow log)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        secs = time.perf_counter() - t0
+        ctx = _current()
+        DB_SECONDS.observe(secs, route=ctx["route"], op=op)
+        ctx["queries"].append({"op": op, "col": col, "filter": filter, "sort": sort,
+                               "limit": limit, "ms": round(secs * 1000, 2)})
+
+@asynccontextmanager
+async def serialize_time():
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        SERIALIZE_SECONDS.observe(time.perf_counter() - t0, route=_current()["route"])
+
+def note_docs(n: int):
+    _current()["docs"] = n
+
+def note_cache(result: str):
+    ctx = _current()
+    CACHE_TOTAL.inc(route=ctx["route"], result=result)
+
+def _route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for r in request.app.router.routes:
+        if r.matches(request.scope)[0] == Match.FULL:
+            return getattr(r, "path", "-")
+    return "unmatched"
+
+async def _explain(q: Dict) -> Dict:
+    cur = q["col"].find(q["filter"] or {})
+    if q["sort"]:
+        cur = cur.sort(q["sort"])
+    if q["limit"]:
+        cur = cur.limit(q["limit"])
+    plan = await cur.explain()
+    stats = plan.get("executionStats", {})
+    return {"stages": list(plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))),
+            "nReturned": stats.get("nReturned"),
+            "keysExamined": stats.get("totalKeysExamined"),
+            "docsExamined": stats.get("totalDocsExamined"),
+            "executionMs": stats.get("executionTimeMillis")}
+
+async def _log_slow(route: str, method: str, status: int, ms: float, queries: List[Dict]):
+    out = []
+    for q in queries:
+        entry = {k: q[k] for k in ("op", "filter", "sort", "limit", "ms")}
+        if q["col"] is not None:
+            try:
+                entry["explain"] = await _explain(q)
+            except Exception as e:
+                entry["explain_error"] = f"{e.__class__.__name__}: {e}"
+        out.append(entry)
+    slow_log.emit("slow_request", route=route, method=method, status=status, ms=round(ms, 1), queries=out)
+
+async def middleware(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    ctx = {"route": "-", "queries": [], "docs": None}
+    token = _ctx.set(ctx)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        # The route is only known once routing ran, but handlers need it while running:
+        # resolve it up front from the path.
+        ctx["route"] = _route_path(request)
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        secs = time.perf_counter() - t0
+        _ctx.reset(token)
+        route = ctx["route"]
+        REQUEST_SECONDS.observe(secs, route=route, method=request.method, status=status)
+        if ctx["docs"] is not None:
+            DOCS_RETURNED.observe(ctx["docs"], route=route)
+        if SLOW_MS > 0 and secs * 1000 >= SLOW_MS:
+            # explain() runs after the response is sent, so the slow request isn't made slower.
+            task = asyncio.create_task(_log_slow(route, request.method, status, secs * 1000, ctx["queries"]))
+            _explains.add(task)
+            task.add_done_callback(_explains.discard)
+
+def render() -> str:
+    return registry.render()
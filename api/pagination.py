@@ -0,0 +1,68 @@
+# api/pagination.py
+# Keyset ("seek") pagination: instead of skip(n), each page resumes right after the last
+# document of the previous one, using the sort key values plus _id as a tie-breaker.
+# The position travels to the client as an opaque base64 cursor.
+
+import json, base64, binascii
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException
+from api.metrics import db_time
+
+Sort = List[Tuple[str, int]]
+
+def with_id(sort: Sort) -> Sort:
+    """Append _id (same direction as the primary key) so the order is total."""
+    return list(sort) + [("_id", sort[0][1] if sort else 1)]
+
+def encode_cursor(doc: Dict, sort: Sort) -> str:
+    values = [doc.get(f) for f, _ in sort if f != "_id"]
+    payload = {"k": [f"{f}:{d}" for f, d in sort], "v": values, "id": str(doc["_id"])}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: Sort) -> Tuple[List[Any], Any]:
+    """-> (sort values, _id). 400 if the cursor is malformed or was issued for another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["k"] != [f"{f}:{d}" for f, d in sort]:
+            raise ValueError("sort mismatch")
+        oid = payload["id"]
+        return payload["v"], ObjectId(oid) if ObjectId.is_valid(oid) else oid
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def _after(field: str, direction: int, value) -> Optional[Dict]:
+    """Documents strictly after `value` on one key. MongoDB sorts null/missing lowest."""
+    if direction < 0:
+        return None if value is None else {"$or": [{field: {"$lt": value}}, {field: None}]}
+    return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+
+def seek_filter(sort: Sort, values: List[Any], last_id) -> Dict:
+    """Filter for everything after (values..., last_id) in `sort` order (sort must end with _id)."""
+    keys = [f for f, _ in sort]
+    vals = list(values) + [last_id]
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, vals[i])
+        if after is None:
+            continue
+        eq = {keys[j]: vals[j] for j in range(i)}
+        branches.append({**eq, **after})
+    return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+async def page(col, query: Dict, sort: Sort, limit: int, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """Fetch one page; returns (documents without _id, cursor for the next page or None)."""
+    sort = with_id(sort)
+    if cursor:
+        values, last_id = decode_cursor(cursor, sort)
+        query = {"$and": [query, seek_filter(sort, values, last_id)]}
+    async with db_time("find", col, query, sort, limit + 1):
+        docs = await col.find(query).sort(sort).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1], sort) if has_more and docs else None
+    for d in docs:
+        d.pop("_id", None)
+    return docs, next_cursor
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 class ProductIn(BaseModel):
+    asin: Optional[str] = None
     category: Optional[str] = None
     title: str
     brand: Optional[str] = None
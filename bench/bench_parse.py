@@ -0,0 +1,117 @@
+# bench/bench_parse.py
+# Offline benchmark of the parsing path (scraper/extract.py) on stored HTML: no network,
+# no browser. For every fixture it reports parse latency, field accuracy against the
+# golden JSON and memory, and exits 1 on an accuracy regression. Memory is reported twice:
+# the Python-side peak of one parse (tracemalloc) and the process max RSS so far, which also
+# covers the libxml2 tree that tracemalloc cannot see.
+#
+#   python -m bench.bench_parse                    # all fixtures, 20 runs each
+#   python -m bench.bench_parse --runs 50 --max-ms 150
+#   python -m bench.bench_parse --update-golden search_ssd_fr   # after checking the new output
+#
+# Fixtures live in bench/fixtures/ as <kind>_<name>_<country>.html[.gz], kind being `search`
+# (links + cards) or `pdp` and country the Amazon domain (fr, de, com...) whose price
+# format applies; the expected output is bench/golden/<kind>_<name>_<country>.json.
+
+import os, sys, gzip, json, glob, time, resource, tracemalloc
+from statistics import median
+from typing import Dict, List, Tuple
+from scraper.extract import parse_html, parse_pdp, parse_search_links, parse_search_cards
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+GOLDEN = os.path.join(HERE, "golden")
+
+def fixture_name(path: str) -> str:
+    return os.path.basename(path).split(".html")[0]
+
+def load(path: str) -> str:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+def parse(name: str, raw: str) -> Dict:
+    """What the scraper extracts from this page: a full parse from the raw string."""
+    country = name.rsplit("_", 1)[-1]
+    doc = parse_html(raw)
+    if name.startswith("pdp_"):
+        return {"pdp": parse_pdp(doc, country)}
+    base = f"https://www.amazon.{country}"
+    return {"links": parse_search_links(doc, base), "cards": parse_search_cards(doc, base)}
+
+def _fields(out: Dict) -> Dict[str, object]:
+    """Flatten an output to {field path: value} so it can be compared field by field."""
+    flat: Dict[str, object] = {}
+    for k, v in out.get("pdp", {}).items():
+        flat[f"pdp.{k}"] = v
+    for i, link in enumerate(out.get("links", [])):
+        flat[f"links[{i}]"] = link
+    for i, card in enumerate(out.get("cards", [])):
+        for k, v in card.items():
+            flat[f"cards[{i}].{k}"] = v
+    return flat
+
+def accuracy(got: Dict, want: Dict) -> Tuple[float, List[str]]:
+    """Share of golden fields reproduced exactly, plus the paths that differ (or are missing/extra)."""
+    g, w = _fields(got), _fields(want)
+    diffs = sorted(k for k in set(g) | set(w) if g.get(k, "<missing>") != w.get(k, "<missing>"))
+    ok = sum(1 for k in w if k in g and g[k] == w[k])
+    return (ok / len(w) if w else 1.0), diffs
+
+def measure(name: str, raw: str, runs: int) -> Dict:
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = parse(name, raw)
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    parse(name, raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+    return {"out": out, "kb": len(raw) / 1024, "median_ms": median(times),
+            "p95_ms": times[min(len(times) - 1, int(0.95 * len(times)))], "peak_mb": peak / 2**20,
+            "rss_mb": maxrss / (2**20 if sys.platform == "darwin" else 2**10)}
+
+def main(runs: int, only: List[str], update: bool, max_ms: float) -> int:
+    paths = sorted(glob.glob(os.path.join(FIXTURES, "*.html")) + glob.glob(os.path.join(FIXTURES, "*.html.gz")))
+    if only:
+        paths = [p for p in paths if fixture_name(p) in only]
+    failed = False
+    print(f"{'fixture':<26}{'KB':>8}{'median ms':>11}{'p95 ms':>9}{'py MB':>8}{'max RSS':>9}{'accuracy':>10}")
+    for path in paths:
+        name = fixture_name(path)
+        golden_path = os.path.join(GOLDEN, f"{name}.json")
+        r = measure(name, load(path), runs)
+        if update:
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(r["out"], f, ensure_ascii=False, indent=1)
+                f.write("\n")
+        if not os.path.exists(golden_path):
+            acc, diffs = None, []
+        else:
+            with open(golden_path, encoding="utf-8") as f:
+                acc, diffs = accuracy(r["out"], json.load(f))
+        slow = bool(max_ms) and r["median_ms"] > max_ms
+        mark = "❌" if (acc is not None and acc < 1.0) or slow else "✅"
+        acc_txt = "no golden" if acc is None else f"{acc:.1%}"
+        print(f"{name:<26}{r['kb']:>8.0f}{r['median_ms']:>11.2f}{r['p95_ms']:>9.2f}{r['peak_mb']:>8.1f}{r['rss_mb']:>9.0f}"
+              f"{acc_txt:>10} {mark}")
+        for d in diffs[:5]:
+            print(f"    ≠ {d}")
+        if len(diffs) > 5:
+            print(f"    ... {len(diffs) - 5} more")
+        failed |= mark == "❌"
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Parse-path benchmark on stored HTML fixtures.")
+    parser.add_argument("fixtures", nargs="*", help="fixture names (default: all)")
+    parser.add_argument("--runs", type=int, default=20, help="timed parses per fixture")
+    parser.add_argument("--max-ms", type=float, default=0, help="fail when a median parse is slower")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="overwrite the golden JSON with the current output")
+    args = parser.parse_args()
+    sys.exit(main(max(1, args.runs), args.fixtures, args.update_golden, args.max_ms))
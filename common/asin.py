@@ -0,0 +1,23 @@
+# common/asin.py
+# ASIN helpers shared by the scraper, the loaders and index maintenance.
+
+import re
+from typing import Optional
+from urllib.parse import unquote
+
+_ASIN_IN_URL = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?=[/?#]|$)")
+
+def asin_from_url(url: Optional[str]) -> Optional[str]:
+    """ASIN from any product URL, including tracking and sponsored redirect links."""
+    if not url:
+        return None
+    m = _ASIN_IN_URL.search(url) or _ASIN_IN_URL.search(unquote(unquote(url)))
+    return m.group(1) if m else None
+
+def canonical_link(base: str, asin: str) -> str:
+    """https://www.amazon.<tld>/dp/<ASIN> — drops slugs, ref= and tracking parameters."""
+    return f"{base.rstrip('/')}/dp/{asin}"
+
+def link_base(url: str) -> str:
+    """'https://www.amazon.fr/Some-Slug/dp/...' -> 'https://www.amazon.fr'"""
+    return "/".join(url.split("/", 3)[:3])
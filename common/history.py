@@ -0,0 +1,85 @@
+# common/history.py
+# Append-only price history. One row per (source, asin) *change* of price, original price
+# or rating — rescrapes that see the same values write nothing, so the collection grows
+# with price churn rather than with crawl frequency.
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from common.db import get_collection
+
+HISTORY_COLL = os.getenv("MONGO_HISTORY_COLLECTION", "price_history")
+TRACKED = ("price", "original_price", "rating")
+
+HISTORY_INDEXES = [
+    IndexModel([("asin", ASCENDING), ("source", ASCENDING), ("ts", DESCENDING)], name="asin_source_ts"),
+]
+
+def history_collection():
+    return get_collection(HISTORY_COLL)
+
+async def record_changes(docs: Iterable[Dict], products=None, history=None,
+                         now: Optional[datetime] = None) -> int:
+    """Append a history row for every doc whose tracked fields differ from the stored product.
+
+    Must run *before* the docs are upserted into `products`. Docs without an asin are
+    ignored; tracked fields a doc doesn't carry (partial updates) keep their stored value.
+    Returns the number of rows written.
+    """
+    products = products if products is not None else get_collection()
+    history = history if history is not None else history_collection()
+    now = now or datetime.now(timezone.utc)
+
+    by_source: Dict[Optional[str], List[Dict]] = {}
+    for d in docs:
+        if d.get("asin"):
+            by_source.setdefault(d.get("source"), []).append(d)
+
+    rows = []
+    for source, group in by_source.items():
+        proj = {"_id": 0, "asin": 1, **{f: 1 for f in TRACKED}}
+        stored = {p["asin"]: p async for p in products.find(
+            {"source": source, "asin": {"$in": [d["asin"] for d in group]}}, proj)}
+        for d in group:
+            before = stored.get(d["asin"]) or {}
+            after = {f: d[f] if f in d else before.get(f) for f in TRACKED}
+            if d["asin"] in stored and all(before.get(f) == after[f] for f in TRACKED):
+                continue
+            rows.append({"asin": d["asin"], "source": source, "ts": now, **after})
+            stored[d["asin"]] = after  # same asin twice in one batch: compare with the newer one
+    if rows:
+        await history.insert_many(rows, ordered=False)
+    return len(rows)
+
+def _match(asin: str, source: Optional[str], days: Optional[int]) -> Dict:
+    q: Dict = {"asin": asin}
+    if source:
+        q["source"] = source
+    if days:
+        q["ts"] = {"$gte": datetime.now(timezone.utc) - timedelta(days=days)}
+    return q
+
+async def get_history(asin: str, source: Optional[str] = None, days: Optional[int] = None,
+                      limit: int = 500) -> List[Dict]:
+    """Change points for one product, oldest first."""
+    cur = history_collection().find(_match(asin, source, days), {"_id": 0}).sort("ts", DESCENDING).limit(limit)
+    rows = await cur.to_list(limit)
+    rows.reverse()
+    return rows
+
+async def lowest_price(asin: str, source: Optional[str] = None, days: int = 30) -> Optional[Dict]:
+    """Cheapest price in effect at any point of the last `days` days (None if no history).
+
+    Because rows are only written on change, the price in effect when the window opened is
+    the last row *before* it, so that row is a candidate too.
+    """
+    col = history_collection()
+    q = _match(asin, source, days)
+    since = q["ts"]["$gte"]
+    inside = await col.find_one({**q, "price": {"$ne": None}}, {"_id": 0},
+                                sort=[("price", ASCENDING), ("ts", DESCENDING)])
+    # No price filter here: a row with price None means there was no price at that point.
+    carried = await col.find_one({**q, "ts": {"$lt": since}}, {"_id": 0}, sort=[("ts", DESCENDING)])
+    candidates = [r for r in (inside, carried) if r and r.get("price") is not None]
+    return min(candidates, key=lambda r: r["price"]) if candidates else None
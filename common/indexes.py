@@ -0,0 +1,154 @@
+# common/indexes.py
+# Index provisioning for the products collection, plus an explain() check that every
+# query shape the API issues is served by an index.
+#
+#   python -m common.indexes                 # create missing indexes (idempotent)
+#   python -m common.indexes --check         # explain each API query shape, exit 1 on COLLSCAN
+#   python -m common.indexes --backfill-asin # give legacy title-keyed docs an asin first
+
+import sys, asyncio
+from typing import Dict, Iterable, List
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from common.db import get_collection
+from common.asin import asin_from_url, canonical_link, link_base
+from common.history import HISTORY_INDEXES, history_collection
+
+INDEXES: List[IndexModel] = [
+    # Products are identified by (source, asin). Partial so legacy documents without an
+    # asin (sample data, pre-ASIN scrapes) don't collide on a null key.
+    IndexModel([("source", ASCENDING), ("asin", ASCENDING)], name="source_asin_unique",
+               unique=True, partialFilterExpression={"asin": {"$type": "string"}}),
+    # /products/{asin}/lowest looks the product up by asin, with source optional: the unique
+    # index above starts with source (and is partial), so it can't serve that.
+    IndexModel([("asin", ASCENDING), ("source", ASCENDING)], name="asin_source"),
+    # /products: keyset pages sorted on (<sort_by>, _id), filtered by price range + min rating,
+    # optionally narrowed by category / brand.
+    IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+    IndexModel([("discount_pct", DESCENDING), ("_id", DESCENDING)], name="discount_id"),
+    IndexModel([("rating", DESCENDING), ("_id", DESCENDING)], name="rating_id"),
+    IndexModel([("category", ASCENDING), ("price", ASCENDING)], name="category_price"),
+    IndexModel([("brand", ASCENDING), ("price", ASCENDING)], name="brand_price"),
+    # /best-deals: keyset pages sorted on (discount_pct desc, rating desc, _id desc).
+    IndexModel([("discount_pct", DESCENDING), ("rating", DESCENDING), ("_id", DESCENDING)],
+               name="discount_rating_id"),
+    # build_filters() in api/models.py issues $text searches; a collection has at most one text index.
+    IndexModel([("title", TEXT), ("category", TEXT), ("brand", TEXT)], name="products_text",
+               weights={"title": 10, "brand": 5, "category": 2}, default_language="none"),
+]
+
+# The filter/sort shapes issued by api/main.py (and api/models.py::build_filters).
+# Keep in sync with the handlers: `--check` fails if any of these needs a collection scan.
+_PRODUCTS = {"price": {"$gte": 0, "$lte": 10000}, "rating": {"$gte": 0}}
+
+QUERY_SHAPES: List[Dict] = [
+    {"name": "products_by_price",
+     "filter": _PRODUCTS, "sort": [("price", ASCENDING), ("_id", ASCENDING)]},
+    {"name": "products_by_discount",
+     "filter": _PRODUCTS, "sort": [("discount_pct", DESCENDING), ("_id", DESCENDING)]},
+    {"name": "products_by_rating",
+     "filter": _PRODUCTS, "sort": [("rating", DESCENDING), ("_id", DESCENDING)]},
+    {"name": "products_category",
+     "filter": {**_PRODUCTS, "category": {"$regex": "ssd", "$options": "i"}},
+     "sort": [("price", ASCENDING), ("_id", ASCENDING)]},
+    {"name": "products_brand",
+     "filter": {**_PRODUCTS, "brand": {"$regex": "acme", "$options": "i"}},
+     "sort": [("price", ASCENDING), ("_id", ASCENDING)]},
+    {"name": "best_deals",
+     "filter": {"discount_pct": {"$ne": None}},
+     "sort": [("discount_pct", DESCENDING), ("rating", DESCENDING), ("_id", DESCENDING)]},
+    {"name": "text_search",
+     "filter": {"$text": {"$search": "ssd"}, "price": {"$gte": 0.0, "$lte": 100.0}}},
+    {"name": "product_lowest",
+     "filter": {"asin": "B000000000"}},
+    {"name": "product_lowest_source",
+     "filter": {"asin": "B000000000", "source": "amazon.fr"}},
+]
+
+async def ensure_indexes(col=None, indexes: Iterable[IndexModel] = INDEXES) -> List[str]:
+    """Create the declared indexes one by one; existing identical ones are a no-op.
+
+    An index whose name/keys clash with a different existing definition is reported and
+    skipped rather than dropped — fix it by hand. Returns the names that are in place.
+    """
+    col = col if col is not None else get_collection()
+    ok = []
+    for model in indexes:
+        name = model.document["name"]
+        try:
+            await col.create_indexes([model])
+            ok.append(name)
+        except OperationFailure as e:
+            print(f"⚠️ Index {name} not created: {e.details.get('errmsg', e) if e.details else e}")
+    return ok
+
+async def ensure_all_indexes() -> List[str]:
+    """Products indexes plus those of the side collections (price history)."""
+    return await ensure_indexes(get_collection()) + await ensure_indexes(history_collection(), HISTORY_INDEXES)
+
+def plan_stages(plan) -> Iterable[str]:
+    """Every `stage` name in an explain() plan tree (e.g. IXSCAN, FETCH, COLLSCAN)."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for v in plan.values():
+            yield from plan_stages(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            yield from plan_stages(v)
+
+async def check_query_plans(col=None, shapes: Iterable[Dict] = QUERY_SHAPES) -> List[Dict]:
+    """Run explain() for each query shape; returns one report dict per shape."""
+    col = col if col is not None else get_collection()
+    reports = []
+    for shape in shapes:
+        cur = col.find(shape["filter"], {"_id": 0}).limit(10)
+        if shape.get("sort"):
+            cur = cur.sort(shape["sort"])
+        plan = (await cur.explain()).get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(plan_stages(plan))
+        reports.append({"name": shape["name"], "stages": stages, "collscan": "COLLSCAN" in stages})
+    return reports
+
+async def backfill_asin(col=None) -> int:
+    """Set asin + canonical /dp/<ASIN> link on documents that only have a product_link.
+
+    When the (source, asin) key already belongs to another document, the legacy copy is
+    a duplicate of it and is deleted. Returns the number of documents touched.
+    """
+    col = col if col is not None else get_collection()
+    touched = 0
+    async for d in col.find({"asin": {"$exists": False}, "product_link": {"$type": "string"}},
+                      {"_id": 1, "source": 1, "product_link": 1}):
+        asin = asin_from_url(d["product_link"])
+        if not asin:
+            continue
+        if await col.find_one({"source": d.get("source"), "asin": asin}, {"_id": 1}):
+            await col.delete_one({"_id": d["_id"]})
+        else:
+            link = canonical_link(link_base(d["product_link"]), asin)
+            await col.update_one({"_id": d["_id"]}, {"$set": {"asin": asin, "product_link": link}})
+        touched += 1
+    return touched
+
+async def _main(backfill: bool, check: bool) -> int:
+    if backfill:
+        print(f"Backfilled/merged {await backfill_asin()} documents.")
+    print("Indexes:", ", ".join(await ensure_all_indexes()))
+    failed = False
+    if check:
+        for r in await check_query_plans():
+            mark = "❌" if r["collscan"] else "✅"
+            print(f"{mark} {r['name']}: {' > '.join(r['stages'])}")
+            failed |= r["collscan"]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill-asin", action="store_true",
+                        help="derive asin from product_link on legacy documents before indexing")
+    parser.add_argument("--check", action="store_true",
+                        help="explain() every API query shape and exit 1 if one does a COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.backfill_asin, args.check)))
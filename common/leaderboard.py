@@ -0,0 +1,133 @@
+# common/leaderboard.py
+# Materialized best-deals leaderboards: the top LEADERBOARD_K products by
+# (discount_pct desc, rating desc, _id desc), globally and per category, stored as one
+# document per scope. save_many merges each written batch into the affected boards, so
+# /best-deals reads a precomputed list instead of sorting the collection.
+#
+# K is larger than any page the dashboard asks for, which leaves room to apply the
+# `min_reviews` filter on read. When a board cannot answer (filtered too thin, or a
+# product dropped out of a truncated board), callers fall back to the live query and
+# the board is rebuilt from Mongo.
+#
+#   python -m common.leaderboard   # rebuild every board (global + one per category)
+
+import os, asyncio
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from common.db import get_collection
+
+LEADERBOARD_COLL = os.getenv("MONGO_LEADERBOARD_COLLECTION", "leaderboards")
+LEADERBOARD_K = int(os.getenv("LEADERBOARD_K", "200"))
+SORT = [("discount_pct", -1), ("rating", -1), ("_id", -1)]
+
+def scope_id(category: Optional[str] = None) -> str:
+    return f"category:{category}" if category else "global"
+
+def _scope_filter(scope: str) -> Dict:
+    q: Dict = {"discount_pct": {"$ne": None}}
+    if scope.startswith("category:"):
+        q["category"] = scope[len("category:"):]
+    return q
+
+def _rank(d: Dict) -> Tuple:
+    # Same order MongoDB gives for SORT: null/missing rating sorts lowest.
+    rating = d.get("rating")
+    return (d["discount_pct"], rating is not None, rating if rating is not None else 0, d["_id"])
+
+def _identity(d: Dict) -> Tuple:
+    return (d.get("source"), d.get("asin") or d.get("title"))
+
+async def rebuild(scope: str, products=None, boards=None) -> Dict:
+    products = products if products is not None else get_collection()
+    boards = boards if boards is not None else get_collection(LEADERBOARD_COLL)
+    entries = await products.find(_scope_filter(scope)).sort(SORT).limit(LEADERBOARD_K + 1).to_list(LEADERBOARD_K + 1)
+    board = await boards.find_one({"_id": scope}, {"rev": 1})
+    doc = {
+        "_id": scope,
+        "entries": entries[:LEADERBOARD_K],
+        "complete": len(entries) <= LEADERBOARD_K,   # holds every qualifying product
+        "rev": (board or {}).get("rev", 0) + 1,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    await boards.replace_one({"_id": scope}, doc, upsert=True)
+    return doc
+
+async def rebuild_all(products=None, boards=None) -> List[str]:
+    products = products if products is not None else get_collection()
+    scopes = [scope_id()] + [scope_id(c) for c in await products.distinct("category") if c]
+    for scope in scopes:
+        await rebuild(scope, products, boards)
+    return scopes
+
+async def apply_batch(docs: Iterable[Dict], products=None, boards=None) -> int:
+    """Merge freshly written products into the global and per-category boards.
+
+    `docs` are the documents just upserted; their stored versions (with _id) are re-read
+    by (source, asin), one query per source. Docs without an asin are left to the next
+    rebuild. Returns the number of boards updated.
+    """
+    products = products if products is not None else get_collection()
+    boards = boards if boards is not None else get_collection(LEADERBOARD_COLL)
+    by_source: Dict[Optional[str], List[str]] = {}
+    for d in docs:
+        if d.get("asin"):
+            by_source.setdefault(d.get("source"), []).append(d["asin"])
+    if not by_source:
+        return 0
+    fresh = []
+    for source, asins in by_source.items():
+        # $type matches the partial filter of source_asin_unique, so the planner can use it.
+        fresh += await products.find({"source": source, "asin": {"$in": asins, "$type": "string"}}).to_list(None)
+    changed = {_identity(d) for d in fresh}
+
+    scopes = {scope_id()} | {scope_id(d["category"]) for d in fresh if d.get("category")}
+    # Boards still listing one of these products under its previous category.
+    asins = sorted({a for group in by_source.values() for a in group})
+    scopes |= {b["_id"] async for b in boards.find({"entries.asin": {"$in": asins}}, {"_id": 1})}
+    for scope in scopes:
+        board = await boards.find_one({"_id": scope})
+        if board is None:
+            await rebuild(scope, products, boards)
+            continue
+        q = _scope_filter(scope)
+        kept = [e for e in board["entries"] if _identity(e) not in changed]
+        dropped = len(kept) < len(board["entries"])
+        added = [d for d in fresh if d.get("discount_pct") is not None
+                 and ("category" not in q or d.get("category") == q["category"])]
+        entries = sorted(kept + added, key=_rank, reverse=True)
+        complete = board.get("complete", False) and len(entries) <= LEADERBOARD_K
+        if not board.get("complete", False) and board["entries"]:
+            # A truncated board knows nothing below its old last entry: products merged in
+            # under that floor may be outranked by ones it never held.
+            floor = _rank(board["entries"][-1])
+            entries = [e for e in entries if _rank(e) >= floor]
+            if dropped and len(entries) < LEADERBOARD_K:
+                await rebuild(scope, products, boards)
+                continue
+        res = await boards.replace_one(
+            {"_id": scope, "rev": board.get("rev", 0)},
+            {"entries": entries[:LEADERBOARD_K], "complete": complete, "rev": board.get("rev", 0) + 1,
+             "updated_at": datetime.now(timezone.utc)})
+        if res.matched_count == 0:   # a concurrent writer got there first
+            await rebuild(scope, products, boards)
+    return len(scopes)
+
+async def read_top(limit: int, min_reviews: int = 0, category: Optional[str] = None,
+                   boards=None) -> Optional[Tuple[List[Dict], int, bool]]:
+    """Top `limit` entries of a board with at least `min_reviews` reviews.
+
+    Returns (entries, matches on the board, whether that count is exact), or None when the
+    board is missing or too thin to answer (the caller should run the live query).
+    """
+    boards = boards if boards is not None else get_collection(LEADERBOARD_COLL)
+    board = await boards.find_one({"_id": scope_id(category)})
+    if board is None:
+        return None
+    hits = [e for e in board["entries"] if not min_reviews or (e.get("reviews") or 0) >= min_reviews]
+    if len(hits) <= limit and not board.get("complete"):
+        return None
+    return hits[:limit], len(hits), bool(board.get("complete"))
+
+if __name__ == "__main__":
+    scopes = asyncio.run(rebuild_all())
+    print(f"✅ Rebuilt {len(scopes)} leaderboards (K={LEADERBOARD_K}).")
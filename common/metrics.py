@@ -0,0 +1,146 @@
+# common/metrics.py
+# Minimal in-process metrics: labelled counters and histograms rendered in the Prometheus
+# text format (for an HTTP endpoint or a node_exporter textfile), plus JSON-lines event logs.
+# No client library needed; everything lives in one process and one event loop.
+
+import os, sys, json, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+# Seconds. Covers a 2 ms parse up to a 60 s navigation timeout.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(kw: Dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+def _fmt(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, n: float = 1, **labels):
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + n
+
+    def get(self, **labels) -> float:
+        return self.values.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_fmt(k)} {v:g}" for k, v in sorted(self.values.items())]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Labels, List] = {}   # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        s = self.series.setdefault(_labels(labels), [0] * (len(self.buckets) + 1) + [0.0])
+        s[bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        s = self.series.get(_labels(labels))
+        return sum(s[:-1]) if s else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate from the buckets, interpolating linearly like PromQL's histogram_quantile."""
+        s = self.series.get(_labels(labels))
+        if not s:
+            return None
+        return bucket_quantile(q, self.buckets, s[:-1])
+
+    def render(self) -> List[str]:
+        out = []
+        for key, s in sorted(self.series.items()):
+            cum = 0
+            for le, n in zip(self.buckets, s):
+                cum += n
+                out.append(f"{self.name}_bucket{_fmt(key, [('le', f'{le:g}')])} {cum}")
+            cum += s[len(self.buckets)]
+            out.append(f"{self.name}_bucket{_fmt(key, [('le', '+Inf')])} {cum}")
+            out.append(f"{self.name}_sum{_fmt(key)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_fmt(key)} {cum}")
+        return out
+
+def bucket_quantile(q: float, buckets: Sequence[float], counts: Sequence[int]) -> Optional[float]:
+    """`counts` per bucket (non-cumulative), the last one being +Inf."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank, cum, lower = q * total, 0, 0.0
+    for le, n in zip(list(buckets) + [buckets[-1]], counts):
+        if n and cum + n >= rank:
+            return lower + (le - lower) * (rank - cum) / n
+        cum += n
+        lower = le
+    return buckets[-1]
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics.values():
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}"] + m.render()
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Atomically write the exposition to `path` (node_exporter textfile collector format)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+class JsonLog:
+    """One JSON object per line. `target` is a file path, "-" for stderr, or empty to disable."""
+
+    def __init__(self, target: Optional[str] = None):
+        self.stream: Optional[TextIO] = None
+        if target == "-":
+            self.stream = sys.stderr
+        elif target:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            self.stream = open(target, "a", encoding="utf-8")
+
+    def emit(self, event: str, **fields):
+        if self.stream is None:
+            return
+        self.stream.write(json.dumps({"ts": round(time.time(), 3), "event": event, **fields},
+                                     ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.stream not in (None, sys.stderr):
+            self.stream.close()
+        self.stream = None
@@ -0,0 +1,20 @@
+# common/version.py
+# A monotonically increasing "data version" per collection, bumped by every writer.
+# Readers (the API cache) compare versions instead of re-running queries.
+
+from pymongo import ReturnDocument
+from common.db import get_collection, COLL_NAME
+
+META_COLL = "meta"
+
+def _key(coll: str) -> str:
+    return f"{coll}_version"
+
+async def bump_version(coll: str = COLL_NAME) -> int:
+    doc = await get_collection(META_COLL).find_one_and_update(
+        {"_id": _key(coll)}, {"$inc": {"v": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+    return doc["v"]
+
+async def get_version(coll: str = COLL_NAME) -> int:
+    doc = await get_collection(META_COLL).find_one({"_id": _key(coll)})
+    return doc["v"] if doc else 0
@@ -84,7 +84,9 @@ with tabs[0]:
         order = st.radio("Order", ["desc", "asc"], horizontal=True, index=0)
 
     if query_btn:
-        params = {
+        # New search: remember the filters and restart from page 1.
+        # cursors[i] fetches page i+1 (None = first page); they come from the API's next_cursor.
+        st.session_state.products_params = {
             "category": category or None,
             "brand": brand or None,
             "min_price": float(min_price),
@@ -92,24 +94,42 @@ with tabs[0]:
             "min_rating": float(min_rating),
             "sort_by": sort_by,
             "order": order,
-            "page": 1,
-            "page_size": page_size,
+            "limit": page_size,
         }
+        st.session_state.products_cursors = [None]
+        st.session_state.products_page = 0
+
+    if "products_params" in st.session_state:
+        params = dict(st.session_state.products_params)
+        cursors = st.session_state.products_cursors
+        page_idx = st.session_state.products_page
+        if cursors[page_idx]:
+            params["cursor"] = cursors[page_idx]
         data = fetch_json("/products", params)
         if data:
             total = data.get("total", data.get("count", 0))  # support either shape
             results = data.get("results", [])
-            st.success(f"Found {total} products.")
+            next_cursor = data.get("next_cursor")
+            if next_cursor and len(cursors) == page_idx + 1:
+                cursors.append(next_cursor)
+            more = "+" if data.get("total_is_estimate") else ""
+            st.success(f"Found {total}{more} products.")
             if not results:
                 st.info("No items for these filters.")
             else:
                 # pagination controls
                 total_pages = max(1, math.ceil(total / page_size))
-                page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
-                if page != 1:
-                    params["page"] = page
-                    data = fetch_json("/products", params)
-                    results = data.get("results", [])
+                prev_col, info_col, next_col = st.columns([1, 2, 1])
+                with prev_col:
+                    if st.button("◀ Previous", disabled=page_idx == 0, use_container_width=True):
+                        st.session_state.products_page -= 1
+                        st.rerun()
+                with info_col:
+                    st.caption(f"Page {page_idx + 1} of {total_pages}{more}")
+                with next_col:
+                    if st.button("Next ▶", disabled=not next_cursor, use_container_width=True):
+                        st.session_state.products_page += 1
+                        st.rerun()
 
                 # grid display (2 columns)
                 grid_cols = st.columns(2)
@@ -0,0 +1,153 @@
+# loadtest/run.py
+# Drives /products and /best-deals at a fixed concurrency and reports p50/p95/p99 latency
+# and throughput per query shape.
+#
+#   python -m loadtest.run --target http://localhost:8000 --concurrency 32 --requests 500
+#   python -m loadtest.run --in-process --mock --products 10000     # no mongod, no server
+#
+# --in-process calls the FastAPI app through httpx's ASGI transport (no sockets), so the
+# numbers are the app's own cost. --mock swaps Mongo for mongomock-motor and seeds it with
+# loadtest/seed.py first; mongomock has no real indexes, so use it for smoke runs and
+# relative comparisons, and a local mongod for absolute numbers at 100k-1M products.
+# The server's response cache is on by default; --no-cache disables it in-process (for a
+# remote server, start it with API_CACHE_SIZE=0).
+
+import sys, json, time, random, asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+import httpx
+from loadtest.seed import BRANDS, Profile, categories, seed as seed_catalogue
+
+Shape = Tuple[str, Callable[[random.Random, Dict], Dict], bool]
+
+def _price_range(rng: random.Random) -> Dict:
+    lo = rng.choice([0, 10, 25, 50, 100])
+    return {"min_price": lo, "max_price": lo + rng.choice([50, 200, 1000, 10000])}
+
+# (path, params builder, follow): with follow, the first page is fetched unmeasured and
+# the measured request is the page behind its next_cursor.
+SHAPES: Dict[str, Shape] = {
+    "products_by_price":    ("/products", lambda r, m: {**_price_range(r), "sort_by": "price", "limit": 20}, False),
+    "products_by_discount": ("/products", lambda r, m: {"sort_by": "discount", "order": "desc", "limit": 20}, False),
+    "products_by_rating":   ("/products", lambda r, m: {"sort_by": "rating", "order": "desc", "min_rating": 4, "limit": 20}, False),
+    "products_category":    ("/products", lambda r, m: {"category": r.choice(m["categories"]), "limit": 20}, False),
+    "products_brand":       ("/products", lambda r, m: {"brand": r.choice(m["brands"]), "limit": 20}, False),
+    "products_page2":       ("/products", lambda r, m: {"sort_by": "price", "limit": 20}, True),
+    "best_deals":           ("/best-deals", lambda r, m: {"limit": 10}, False),
+    "best_deals_reviews":   ("/best-deals", lambda r, m: {"limit": 10, "min_reviews": r.choice([50, 500, 5000])}, False),
+    "best_deals_category":  ("/best-deals", lambda r, m: {"limit": 10, "category": r.choice(m["categories"])}, False),
+    "best_deals_page2":     ("/best-deals", lambda r, m: {"limit": 10}, True),
+}
+
+def percentile(sorted_ms: List[float], p: float) -> Optional[float]:
+    if not sorted_ms:
+        return None
+    k = min(len(sorted_ms) - 1, max(0, round(p / 100 * len(sorted_ms) + 0.5) - 1))
+    return sorted_ms[k]
+
+async def _one(client: httpx.AsyncClient, path: str, params: Dict, follow: bool) -> Tuple[float, int]:
+    if follow:
+        first = await client.get(path, params=params)
+        cursor = first.json().get("next_cursor") if first.status_code == 200 else None
+        if cursor:
+            params = {**params, "cursor": cursor}
+    t0 = time.perf_counter()
+    r = await client.get(path, params=params)
+    return (time.perf_counter() - t0) * 1000, r.status_code
+
+async def run_shape(client: httpx.AsyncClient, name: str, requests: int, concurrency: int,
+                    meta: Dict, rng_seed: int = 1) -> Dict:
+    path, build, follow = SHAPES[name]
+    rng = random.Random(rng_seed)
+    jobs = [build(rng, meta) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while jobs:
+            params = jobs.pop()
+            try:
+                ms, status = await _one(client, path, params, follow)
+                latencies.append(ms)
+                errors += status >= 400
+            except httpx.HTTPError:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {"shape": name, "requests": requests, "errors": errors,
+            "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99), "max_ms": latencies[-1] if latencies else None,
+            "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+            "rps": round(len(latencies) / wall, 1) if wall else None}
+
+def report(rows: List[Dict]):
+    print(f"{'shape':<22}{'req':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'req/s':>9}")
+    fmt = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+    for r in rows:
+        print(f"{r['shape']:<22}{r['requests']:>6}{r['errors']:>5}{fmt(r['p50_ms'])}{fmt(r['p95_ms'])}"
+              f"{fmt(r['p99_ms'])}{fmt(r['max_ms'])}{fmt(r['rps'])}")
+
+async def _client(args) -> httpx.AsyncClient:
+    if not args.in_process:
+        return httpx.AsyncClient(base_url=args.target, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency))
+    if args.mock:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mock needs mongomock-motor: pip install mongomock-motor")
+        import common.db
+        common.db._client = AsyncMongoMockClient()
+    if args.products:
+        r = await seed_catalogue(args.products, args.categories, drop=True)
+        print(f"Seeded {r['products']} products in {r['seconds']}s")
+    import api.cache
+    from api.main import app
+    if not args.cache:
+        api.cache.CACHE_SIZE = 0
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api",
+                             timeout=args.timeout)
+
+async def main(args) -> int:
+    if (args.mock or args.products) and not args.in_process:
+        raise SystemExit("--mock/--products only apply with --in-process (seed a server with python -m loadtest.seed)")
+    names = args.shapes or list(SHAPES)
+    unknown = set(names) - set(SHAPES)
+    if unknown:
+        raise SystemExit(f"unknown shape(s): {', '.join(sorted(unknown))}; choose from {', '.join(SHAPES)}")
+    profile = Profile.load()
+    meta = {"categories": categories(profile, args.categories), "brands": BRANDS}
+    rows = []
+    async with await _client(args) as client:
+        for name in names:
+            if args.warmup:
+                await run_shape(client, name, args.warmup, args.concurrency, meta, rng_seed=0)
+            rows.append(await run_shape(client, name, args.requests, args.concurrency, meta))
+    report(rows)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"concurrency": args.concurrency, "results": rows}, f, indent=2)
+    return 1 if any(r["errors"] for r in rows) else 0
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("shapes", nargs="*", help=f"query shapes (default: all): {', '.join(SHAPES)}")
+    parser.add_argument("--target", default="http://localhost:8000", help="base URL of a running API")
+    parser.add_argument("--in-process", action="store_true", help="call the app through ASGI instead of HTTP")
+    parser.add_argument("--mock", action="store_true", help="with --in-process: mongomock-motor instead of MONGO_URI")
+    parser.add_argument("--products", type=int, default=0,
+                        help="with --in-process: (re)seed this many synthetic products first")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per shape")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per shape")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True,
+                        help="keep the API response cache on (in-process only)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--out", default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,128 @@
+# loadtest/seed.py
+# Synthetic catalogue for load tests. Values are drawn from the distributions of a real
+# scrape (samples/data_sample.json by default): prices, discounts, ratings and review
+# counts are resampled from it with multiplicative noise, spread over many categories
+# with a skewed (Zipf-like) popularity. Every row validates against api/schemas.py::ProductIn.
+#
+#   python -m loadtest.seed --products 100000            # into MONGO_URI (source="loadtest")
+#   python -m loadtest.seed --products 10000 --drop      # replace the previous synthetic set
+#
+# Rows are tagged source="loadtest", so --drop never touches scraped products.
+
+import os, json, time, random, asyncio
+from typing import Dict, Iterator, List, Optional
+from api.schemas import ProductIn
+from common.db import get_collection
+from common.indexes import ensure_all_indexes
+from common.leaderboard import rebuild_all
+from common.version import bump_version
+
+PROFILE = os.path.join(os.path.dirname(__file__), "..", "samples", "data_sample.json")
+SOURCE = "loadtest"
+BATCH = 5000
+WORKERS = 4
+
+_WORDS = ["ssd", "headphones", "monitor", "keyboard", "mouse", "webcam", "router", "laptop",
+          "tablet", "charger", "cable", "speaker", "microphone", "printer", "camera", "drone",
+          "watch", "lamp", "vacuum", "kettle", "blender", "toaster", "fan", "heater", "drill"]
+BRANDS = ["Acme", "Zeta", "Nova", "Orion", "Vertex", "Pulse", "Lumen", "Apex", "Kite", "Quanta",
+           "Helix", "Nimbus", "Ember", "Atlas", "Cobalt", "Flux", "Ionic", "Mosaic", "Onyx", "Prism"]
+
+class Profile:
+    """Empirical value pools taken from a sample export."""
+
+    def __init__(self, rows: List[Dict]):
+        def pool(key):
+            return [r[key] for r in rows if r.get(key) is not None]
+        self.prices = pool("price") or [50.0]
+        self.discounts = pool("discount_pct") or [15.0]
+        self.ratings = pool("rating") or [4.3]
+        self.reviews = pool("reviews") or [100]
+        self.p_discount = len(self.discounts) / len(rows) if rows else 0.5
+        self.p_rating = len(self.ratings) / len(rows) if rows else 0.95
+        self.categories = sorted({r["category"] for r in rows if r.get("category")})
+
+    @classmethod
+    def load(cls, path: str = PROFILE) -> "Profile":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+def categories(profile: Profile, n: int) -> List[str]:
+    names = list(profile.categories)
+    i = 0
+    while len(names) < n:
+        w = _WORDS[i % len(_WORDS)]
+        names.append(w if i < len(_WORDS) else f"{w} {i // len(_WORDS) + 1}")
+        i += 1
+    return names[:n]
+
+def generate(n: int, n_categories: int = 50, profile: Optional[Profile] = None,
+             seed: int = 42) -> Iterator[Dict]:
+    profile = profile or Profile.load()
+    rng = random.Random(seed)
+    cats = categories(profile, n_categories)
+    cat_weights = [1 / (i + 1) ** 0.9 for i in range(len(cats))]       # a few big categories
+    cat_scale = {c: rng.lognormvariate(0, 0.8) for c in cats}          # price level per category
+    for i in range(n):
+        cat = rng.choices(cats, cat_weights)[0]
+        price = round(rng.choice(profile.prices) * cat_scale[cat] * rng.lognormvariate(0, 0.35), 2)
+        discount = original = None
+        if rng.random() < profile.p_discount:
+            discount = round(min(90.0, max(1.0, rng.choice(profile.discounts) * rng.uniform(0.7, 1.3))), 2)
+            original = round(price / (1 - discount / 100), 2)
+        rating = None
+        if rng.random() < profile.p_rating:
+            rating = round(min(5.0, max(1.0, rng.choice(profile.ratings) + rng.gauss(0, 0.25))), 1)
+        reviews = int(rng.choice(profile.reviews) * rng.lognormvariate(0, 1.5))
+        brand = rng.choice(BRANDS) if rng.random() < 0.6 else None
+        asin = f"L{i:09d}"
+        yield ProductIn(
+            asin=asin, category=cat, title=f"{brand or 'Generic'} {cat} model {i}", brand=brand,
+            price=price, original_price=original, discount_pct=discount, rating=rating, reviews=reviews,
+            product_link=f"https://www.amazon.fr/dp/{asin}", image=None, availability=None, source=SOURCE,
+        ).model_dump()
+
+async def seed(n: int, n_categories: int = 50, drop: bool = False, batch: int = BATCH,
+               workers: int = WORKERS, seed_value: int = 42, col=None) -> Dict:
+    col = col if col is not None else get_collection()
+    if drop:
+        await col.delete_many({"source": SOURCE})
+    elif await col.find_one({"source": SOURCE}, {"_id": 1}):
+        raise SystemExit(f"A synthetic catalogue is already loaded (source={SOURCE!r}); pass --drop to replace it.")
+    await ensure_all_indexes()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+
+    async def worker():
+        while (docs := await queue.get()) is not None:
+            await col.insert_many(docs, ordered=False)
+
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    rows: List[Dict] = []
+    for doc in generate(n, n_categories, seed=seed_value):
+        rows.append(doc)
+        if len(rows) >= batch:
+            await queue.put(rows)
+            rows = []
+    if rows:
+        await queue.put(rows)
+    for _ in tasks:
+        await queue.put(None)
+    await asyncio.gather(*tasks)
+    secs = time.perf_counter() - t0
+    await rebuild_all(col)
+    await bump_version()
+    return {"products": n, "categories": n_categories, "seconds": round(secs, 2),
+            "rows_per_s": round(n / secs) if secs else None}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--drop", action="store_true", help="delete previous source=loadtest rows first")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed (same seed, same catalogue)")
+    args = parser.parse_args()
+    r = asyncio.run(seed(args.products, args.categories, args.drop, seed_value=args.seed))
+    print(f"✅ Seeded {r['products']} products in {r['categories']} categories "
+          f"in {r['seconds']}s ({r['rows_per_s']:,} rows/s)")
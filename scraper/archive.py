@@ -0,0 +1,230 @@
+# scraper/archive.py
+# Optional archive of every fetched page (SCRAPER_ARCHIVE_DIR, or --archive; off when empty),
+# so improved extractors can be re-run over history without re-fetching:
+#   <dir>/objects/ab/abcdef....html.zst   page bodies, content-addressed by sha256 (identical
+#                                         pages are stored once)
+#   <dir>/index.sqlite                    one row per fetch: url, asin, kind, query, domain,
+#                                         fetched_at, sha256, sizes
+# Compression and file/SQLite writes run on one background thread; `put()` returns at once.
+# zstd needs `pip install zstandard`; without it pages are stored gzip-compressed (.gz).
+#
+#   python -m scraper.archive stats
+#   python -m scraper.archive list --asin B0XXXXXXXX
+#   python -m scraper.archive reparse --kind pdp --since 2025-01-01 > reparsed.jsonl
+
+import os, gzip, json, sqlite3, hashlib, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_DIR = os.getenv("SCRAPER_ARCHIVE_DIR", "")
+ZSTD_LEVEL  = int(os.getenv("SCRAPER_ARCHIVE_ZSTD_LEVEL", "10"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    asin TEXT,
+    kind TEXT NOT NULL,
+    query TEXT,
+    domain TEXT,
+    fetched_at TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_asin ON pages (asin, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at);
+CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+"""
+
+def _compress(data: bytes) -> Tuple[bytes, str]:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6), ".gz"
+
+def _decompress(data: bytes, path: str) -> bytes:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise SystemExit("This archive holds zstd pages: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class Archive:
+    """Content-addressed page store with a SQLite index. Writes are serialized on one thread."""
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self._pending = set()
+        self.stats = {"pages": 0, "new_objects": 0, "bytes": 0, "stored_bytes": 0, "errors": 0}
+
+    def put(self, html: str, url: str, kind: str, asin: Optional[str] = None,
+            query: Optional[str] = None, domain: Optional[str] = None):
+        """Queue one fetched page for archiving (non-blocking; see `close()`)."""
+        fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        fut = asyncio.get_running_loop().run_in_executor(
+            self._pool, self._write, html, url, kind, asin, query, domain, fetched_at)
+        self._pending.add(fut)
+        fut.add_done_callback(self._done)
+
+    def _done(self, fut):
+        self._pending.discard(fut)
+        if fut.exception() is not None:
+            self.stats["errors"] += 1
+            print("Archive error:", fut.exception())
+
+    def _write(self, html: str, url: str, kind: str, asin: Optional[str], query: Optional[str],
+               domain: Optional[str], fetched_at: str):
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        row = self._db.execute("SELECT path, stored_size FROM pages WHERE sha256 = ? LIMIT 1",
+                               (digest,)).fetchone()
+        if row and os.path.exists(os.path.join(self.root, row[0])):
+            rel, stored = row
+        else:
+            blob, ext = _compress(data)
+            rel = os.path.join("objects", digest[:2], digest + ".html" + ext)
+            path = os.path.join(self.root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(blob)
+            os.replace(path + ".tmp", path)
+            stored = len(blob)
+            self.stats["new_objects"] += 1
+            self.stats["stored_bytes"] += stored
+        self._db.execute(
+            "INSERT INTO pages (url, asin, kind, query, domain, fetched_at, sha256, size, stored_size, path)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, asin, kind, query, domain, fetched_at, digest, len(data), stored, rel))
+        self._db.commit()
+        self.stats["pages"] += 1
+        self.stats["bytes"] += len(data)
+
+    async def close(self):
+        """Wait for queued writes, then release the thread and the index."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        self._pool.shutdown(wait=True)
+        self._db.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['pages']} pages, {s['new_objects']} new objects "
+                f"({s['bytes'] / 1e6:.1f} MB -> {s['stored_bytes'] / 1e6:.1f} MB stored)"
+                + (f", {s['errors']} errors" if s["errors"] else ""))
+
+# The process-wide store is opened on the first saved page, so commands that never fetch
+# (status, enqueue) don't create the archive.
+_root: str = ARCHIVE_DIR
+store: Optional[Archive] = None
+
+def set_archive(root: Optional[str]):
+    """Archive pages under `root` from now on (empty to stop archiving new pages)."""
+    global _root, store
+    root = root or ""
+    if root == _root:
+        return
+    if store is not None:
+        # Called before any crawl starts: nothing is queued, so just release the thread and index.
+        store._pool.shutdown(wait=True)
+        store._db.close()
+        store = None
+    _root = root
+
+def save(html: str, url: str, kind: str, **fields):
+    global store
+    if store is None and _root:
+        store = Archive(_root)
+    if store is not None:
+        store.put(html, url, kind, **fields)
+
+async def close():
+    global store
+    if store is not None:
+        done, store = store, None
+        await done.close()
+        print(f"🗄️ Archived {done.summary()} in {done.root}")
+
+def query_pages(root: str, kind: Optional[str] = None, asin: Optional[str] = None,
+                url: Optional[str] = None, since: Optional[str] = None,
+                latest: bool = False) -> List[Dict]:
+    """Index rows matching the filters, oldest first (latest: only the newest fetch per URL)."""
+    where, args = [], []
+    for col, val in (("kind", kind), ("asin", asin), ("url", url)):
+        if val:
+            where.append(f"{col} = ?")
+            args.append(val)
+    if since:
+        where.append("fetched_at >= ?")
+        args.append(since)
+    sql = "SELECT * FROM pages" + (" WHERE " + " AND ".join(where) if where else "")
+    if latest:
+        sql = f"SELECT * FROM ({sql}) p WHERE id = (SELECT MAX(id) FROM pages q WHERE q.url = p.url)"
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+    db.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in db.execute(sql + " ORDER BY fetched_at, id", args)]
+    finally:
+        db.close()
+
+def read_page(root: str, row: Dict) -> str:
+    path = os.path.join(root, row["path"])
+    with open(path, "rb") as f:
+        return _decompress(f.read(), path).decode("utf-8")
+
+def iter_pages(root: str, **filters) -> Iterator[Tuple[Dict, str]]:
+    """(index row, html) for every archived fetch matching `query_pages` filters."""
+    for row in query_pages(root, **filters):
+        yield row, read_page(root, row)
+
+def _stats(root: str) -> Dict:
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"))
+    try:
+        pages, raw, first, last = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(fetched_at), MAX(fetched_at) FROM pages").fetchone()
+        objects, stored = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM"
+            " (SELECT sha256, MAX(stored_size) AS stored_size FROM pages GROUP BY sha256)").fetchone()
+        kinds = dict(db.execute("SELECT kind, COUNT(*) FROM pages GROUP BY kind").fetchall())
+    finally:
+        db.close()
+    return {"pages": pages, "objects": objects, "raw_mb": round(raw / 1e6, 1),
+            "stored_mb": round(stored / 1e6, 1), "kinds": kinds, "first": first, "last": last}
+
+if __name__ == "__main__":
+    import sys, argparse
+    from scraper.extract import parse_text
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["stats", "list", "reparse"])
+    parser.add_argument("--dir", default=ARCHIVE_DIR or os.path.join("data", "archive"))
+    parser.add_argument("--kind", choices=["search", "pdp"])
+    parser.add_argument("--asin")
+    parser.add_argument("--url")
+    parser.add_argument("--since", help="ISO date/time (UTC), e.g. 2025-01-01")
+    parser.add_argument("--latest", action="store_true", help="only the newest fetch of each URL")
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.dir, "index.sqlite")):
+        raise SystemExit(f"No archive in {args.dir}")
+    filters = dict(kind=args.kind, asin=args.asin, url=args.url, since=args.since, latest=args.latest)
+    if args.command == "stats":
+        print(json.dumps(_stats(args.dir), indent=2))
+    elif args.command == "list":
+        for r in query_pages(args.dir, **filters):
+            print(f"{r['fetched_at']}  {r['kind']:<6} {r['asin'] or '-':<11} {r['size']:>8}  {r['url']}")
+    else:
+        for row, html in iter_pages(args.dir, **filters):
+            base = f"https://{row['domain']}" if row["domain"] else "https://www.amazon.fr"
+            out = parse_text(html, "pdp" if row["kind"] == "pdp" else "cards", base)
+            rec = {k: row[k] for k in ("url", "asin", "fetched_at", "sha256")}
+            sys.stdout.write(json.dumps({**rec, **out}, ensure_ascii=False) + "\n")
@@ -0,0 +1,111 @@
+# scraper/blocking.py
+# Playwright request interception: abort heavy or useless sub-resources (images, fonts,
+# ads, analytics beacons) before they hit the network. We only read text and the
+# image `src` attribute, so none of them are needed to extract a product.
+#
+# Note: routing a context disables Playwright's HTTP cache for it, which is fine here
+# because nearly everything worth caching is blocked anyway.
+
+import os
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+def _csv(value: Optional[str]) -> set:
+    return {v.strip().lower() for v in (value or "").split(",") if v.strip()}
+
+# Playwright resource types: document, stylesheet, image, media, font, script, texttrack,
+# xhr, fetch, eventsource, websocket, manifest, other.
+DEFAULT_DENY_TYPES = {"image", "media", "font"}
+
+# Ad / tracking endpoints seen on Amazon pages (substring match on the URL).
+DEFAULT_DENY_HOSTS = {
+    "amazon-adsystem.com", "aax-eu.amazon", "aax-us-east.amazon", "aax.amazon",
+    "unagi.amazon", "unagi-eu.amazon", "unagi-na.amazon",
+    "fls-eu.amazon", "fls-na.amazon", "/uedata", "/1/batch/1/oe/",
+    "doubleclick.net", "googlesyndication.com", "google-analytics.com", "googletagmanager.com",
+}
+
+# Rough average transfer size per resource type, used to estimate bytes avoided for
+# types we never let through (and therefore never observe).
+TYPICAL_BYTES = {
+    "image": 45_000, "media": 250_000, "font": 60_000, "stylesheet": 30_000,
+    "script": 40_000, "xhr": 5_000, "fetch": 5_000, "other": 2_000,
+}
+
+BLOCK_RESOURCES = os.getenv("SCRAPER_BLOCK", "true").lower() in ("1", "true", "yes")
+
+class ResourceBlocker:
+    """Allow/deny sub-requests by resource type and URL pattern, and count what was avoided.
+
+    `allow_types` is an allow-list: when non-empty, every other type is blocked.
+    Top-level documents are never blocked.
+    """
+
+    def __init__(self, deny_types: Iterable[str] = DEFAULT_DENY_TYPES,
+                 allow_types: Iterable[str] = (),
+                 deny_hosts: Iterable[str] = DEFAULT_DENY_HOSTS):
+        self.deny_types = {t.lower() for t in deny_types}
+        self.allow_types = {t.lower() for t in allow_types}
+        self.deny_hosts = {h.lower() for h in deny_hosts}
+        self.blocked: Counter = Counter()
+        self.allowed: Counter = Counter()
+        self.bytes_in: Counter = Counter()      # content-length of responses we let through
+        self.sized: Counter = Counter()         # responses that reported a content-length
+
+    @classmethod
+    def from_env(cls) -> "ResourceBlocker":
+        """SCRAPER_BLOCK_TYPES / SCRAPER_ALLOW_TYPES / SCRAPER_BLOCK_HOSTS (comma separated).
+
+        SCRAPER_BLOCK_HOSTS extends the default ad/tracker list rather than replacing it.
+        """
+        deny = _csv(os.getenv("SCRAPER_BLOCK_TYPES")) or DEFAULT_DENY_TYPES
+        allow = _csv(os.getenv("SCRAPER_ALLOW_TYPES"))
+        hosts = DEFAULT_DENY_HOSTS | _csv(os.getenv("SCRAPER_BLOCK_HOSTS"))
+        return cls(deny, allow, hosts)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type == "document":
+            return False
+        if self.allow_types and resource_type not in self.allow_types:
+            return True
+        if resource_type in self.deny_types:
+            return True
+        u = url.lower()
+        return any(h in u for h in self.deny_hosts)
+
+    async def attach(self, ctx):
+        await ctx.route("**/*", self._handle)
+        ctx.on("response", self._on_response)
+
+    async def _handle(self, route, request):
+        rtype = request.resource_type
+        if self.should_block(rtype, request.url):
+            self.blocked[rtype] += 1
+            await route.abort()
+        else:
+            self.allowed[rtype] += 1
+            await route.continue_()
+
+    def _on_response(self, response):
+        try:
+            size = int(response.headers.get("content-length", ""))
+        except ValueError:
+            return
+        rtype = response.request.resource_type
+        self.bytes_in[rtype] += size
+        self.sized[rtype] += 1
+
+    def _avg_bytes(self, rtype: str) -> int:
+        if self.sized[rtype]:
+            return self.bytes_in[rtype] // self.sized[rtype]
+        return TYPICAL_BYTES.get(rtype, TYPICAL_BYTES["other"])
+
+    def summary(self) -> Dict:
+        bytes_avoided = sum(n * self._avg_bytes(t) for t, n in self.blocked.items())
+        return {
+            "requests_blocked": sum(self.blocked.values()),
+            "requests_allowed": sum(self.allowed.values()),
+            "blocked_by_type": dict(self.blocked),
+            "bytes_downloaded": sum(self.bytes_in.values()),
+            "bytes_avoided_est": bytes_avoided,
+        }
@@ -0,0 +1,38 @@
+# scraper/browser_server.py
+# Long-lived Chromium that scraper runs attach to instead of launching their own browser:
+# start it once, then pass its endpoint with --connect (or SCRAPER_BROWSER_ENDPOINT).
+#
+#   python -m scraper.browser_server --port 9222
+#   python -m scraper.scrape_amazon_playwright "ssd 1to" --connect http://127.0.0.1:9222
+#
+# Each run still opens (and closes) its own contexts, seeded from the saved per-domain
+# sessions, so runs don't share state beyond what SCRAPER_SESSION_DIR already keeps; what
+# is saved is the browser launch. Playwright's Python API has no launchServer(), so this
+# exposes Chromium's DevTools port (connect_over_cdp); for Firefox, run Playwright's own
+# server (`playwright run-server --port 3000`) and attach with ws://127.0.0.1:3000/.
+
+import asyncio
+from playwright.async_api import async_playwright
+from scraper.scrape_amazon_playwright import HEADLESS
+
+async def serve(port: int, headless: bool = HEADLESS):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless,
+                                          args=[f"--remote-debugging-port={port}",
+                                                "--remote-debugging-address=127.0.0.1"])
+        print(f"🌐 Chromium {browser.version} listening on http://127.0.0.1:{port} (Ctrl+C to stop)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await browser.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9222)
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=HEADLESS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port, args.headless))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,291 @@
+# scraper/extract.py
+# In-process field extraction from raw Amazon HTML (search grids and PDPs).
+# The live scraper grabs `page.content()` once and hands it here instead of issuing
+# one browser round-trip per selector; the same functions re-parse saved pages offline:
+#
+#   python -m scraper.extract last_search.html last_page.html
+#   python -m scraper.extract archive/*.html --kind pdp
+
+import re, sys, json, glob
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse, parse_qs
+from lxml import etree, html as lhtml
+from common.asin import asin_from_url, canonical_link  # re-exported for scraper code
+
+def _cls(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+# XPath equivalents of the CSS selectors the Playwright version used, compiled once.
+_X = etree.XPath
+
+PRICE_PATHS = [
+    # The price to pay first: corePrice_desktop lists the struck-through list price above it.
+    _X(f"//span[{_cls('apexPriceToPay')}]/span[{_cls('a-offscreen')}]"),
+    _X(f"//*[@id='corePrice_desktop']//span[{_cls('a-price')} and not({_cls('a-text-price')})]"
+       f"/span[{_cls('a-offscreen')}]"),
+    _X(f"//span[{_cls('a-price')}]/span[{_cls('a-offscreen')}]"),
+    _X("//*[@id='price_inside_buybox']"),
+]
+ORIG_PATHS = [
+    _X(f"//*[@id='corePrice_desktop']//span[{_cls('a-text-price')}]/span[{_cls('a-offscreen')}]"),
+    _X(f"//span[{_cls('a-price')} and {_cls('a-text-price')}]/span[{_cls('a-offscreen')}]"),
+    _X("//*[@id='priceblock_ourprice']"),
+]
+TITLE_PATH   = _X("//*[@id='productTitle']")
+RATING_PATH  = _X("//span[@data-hook='rating-out-of-text'] | "
+                  f"//span[@id='acrPopover']//span[{_cls('a-icon-alt')}]")
+REVIEWS_PATH = _X("//*[@id='acrCustomerReviewText']")
+IMAGE_PATHS  = [_X("//*[@id='imgTagWrapperId']//img/@src"), _X("//img[@id='landingImage']/@src")]
+
+CARD_PATH      = _X(f"//div[{_cls('s-result-item')}][@data-component-type='s-search-result'][@data-asin]")
+CARD_LINK_PATH = _X(".//h2//a/@href | .//a[.//h2]/@href")
+ANY_DP_PATH    = _X("//a[contains(@href, '/dp/')]/@href")
+
+# Fields available on the search grid itself (relative to one card).
+CARD_TITLE_PATH   = _X(".//h2//span | .//h2")
+CARD_PRICE_PATH   = _X(f".//span[{_cls('a-price')} and not({_cls('a-text-price')})]/span[{_cls('a-offscreen')}]")
+CARD_ORIG_PATH    = _X(f".//span[{_cls('a-price')} and {_cls('a-text-price')}]/span[{_cls('a-offscreen')}]")
+CARD_RATING_PATH  = _X(f".//span[{_cls('a-icon-alt')}]")
+CARD_REVIEWS_PATH = _X(f".//a[span[{_cls('s-underline-text')}]]/@aria-label")
+CARD_IMAGE_PATH   = _X(f".//img[{_cls('s-image')}]/@src")
+
+# Amazon's robot check ("Enter the characters you see below"), served with a 200.
+CAPTCHA_PATH = _X("boolean(//form[contains(@action, 'validateCaptcha')] | //input[@id='captchacharacters'])")
+
+_LEADING_COUNT = re.compile(r"\d[\d\s.,]*")
+_NUMBER        = re.compile(r"\d[\d .,']*")
+
+# Country domain (as in scrape_amazon_playwright.LOCALES) -> decimal separator of its
+# prices, and the "x out of 5" wording of its ratings.
+DECIMAL_SEP = {"fr": ",", "de": ",", "it": ",", "es": ",", "nl": ",", "co.uk": ".", "com": "."}
+OUT_OF = {"fr": "sur", "de": "von", "it": "su", "es": "de", "nl": "van", "co.uk": "out of", "com": "out of"}
+_RATING = re.compile(r"(\d+(?:[.,]\d+)?)\s+(?:%s)\s+5\b" % "|".join(sorted(set(OUT_OF.values()), key=len, reverse=True)))
+
+def country_of(url: Optional[str]) -> Optional[str]:
+    """'https://www.amazon.co.uk/dp/...' -> 'co.uk' (None for other hosts)."""
+    host = urlparse(url or "").netloc.lower()
+    return host.split("amazon.", 1)[1] if "amazon." in host else None
+
+def parse_html(raw: str):
+    return lhtml.document_fromstring(raw)
+
+def _text(el) -> str:
+    return " ".join(el.text_content().split())
+
+def _first_text(doc, path) -> Optional[str]:
+    for el in path(doc):
+        t = _text(el)
+        if t:
+            return t
+    return None
+
+def _decimal_sep(s: str, number: str, country: Optional[str]) -> str:
+    # Prices show cents, and groups are 3 digits: a trailing 2-digit group settles it. That
+    # also covers pages shown in another language than the domain's (€399.00 on amazon.fr).
+    m = re.search(r"([.,])\d{2}$", number)
+    if m:
+        return m.group(1)
+    if country in DECIMAL_SEP:
+        return DECIMAL_SEP[country]
+    if "$" in s or "£" in s:
+        return "."
+    if "€" in s:
+        return ","
+    m = re.search(r"([.,])\d$", number)
+    return m.group(1) if m else ""
+
+def price_to_float(s: Optional[str], country: Optional[str] = None) -> Optional[float]:
+    """'1 234,56 €' / '1.234,56 €' / '£1,234.56' / '$1,099.00' -> float.
+
+    For amounts without cents ('1.234 €', '$1,234') the decimal separator comes from
+    `country` (fr, de, co.uk, com...), else from the currency symbol.
+    """
+    if not s:
+        return None
+    s = s.strip().replace("\xa0", " ").replace("\u202f", " ")
+    m = _NUMBER.search(s)
+    if not m:
+        return None
+    number = m.group(0).strip(" .,'")
+    sep = _decimal_sep(s, number, country)
+    whole, _, frac = number.rpartition(sep) if sep and sep in number else (number, "", "")
+    digits = "".join(ch for ch in whole if ch.isdigit())
+    try:
+        return float(f"{digits}.{frac}" if frac else digits)
+    except ValueError:
+        return None
+
+def rating_to_float(txt: Optional[str]) -> Optional[float]:
+    """'4,5 sur 5 étoiles' / '4,5 von 5 Sternen' / '4.5 out of 5 stars' -> 4.5
+
+    Any wording in OUT_OF is accepted (a .de page may be shown in English); ratings have
+    one decimal, so either separator reads the same.
+    """
+    if not txt:
+        return None
+    m = _RATING.search(txt)
+    return float(m.group(1).replace(",", ".")) if m else None
+
+def reviews_to_int(txt: Optional[str]) -> Optional[int]:
+    if not txt:
+        return None
+    # '1 234 évaluations' / '(1,234)' -> 1234: keep the leading run of digits and separators
+    m = _LEADING_COUNT.match(txt.strip().strip("()"))
+    t = "".join(ch for ch in m.group(0) if ch.isdigit()) if m else ""
+    return int(t) if t else None
+
+def discount_pct(price: Optional[float], original: Optional[float]) -> Optional[float]:
+    if price is None or not original or original <= 0:
+        return None
+    return round(100 * (original - price) / original, 2)
+
+def parse_pdp(raw, country: Optional[str] = None) -> Dict:
+    """Extract the PDP fields from raw HTML (or an already parsed document).
+
+    `country` is the Amazon domain the page came from (see `price_to_float`).
+    """
+    doc = parse_html(raw) if isinstance(raw, str) else raw
+
+    price_txt = None
+    for path in PRICE_PATHS:
+        price_txt = _first_text(doc, path)
+        if price_txt:
+            break
+    price = price_to_float(price_txt, country)
+
+    orig_txt = None
+    for path in ORIG_PATHS:
+        for el in path(doc):
+            t = _text(el)
+            if t and t != price_txt:
+                orig_txt = t
+                break
+        if orig_txt:
+            break
+    original = price_to_float(orig_txt, country)
+
+    image = None
+    for path in IMAGE_PATHS:
+        srcs = path(doc)
+        if srcs and srcs[0]:
+            image = srcs[0]
+            break
+
+    return {
+        "title": _first_text(doc, TITLE_PATH),
+        "price": price,
+        "original_price": original,
+        "discount_pct": discount_pct(price, original),
+        "rating": rating_to_float(_first_text(doc, RATING_PATH)),
+        "reviews": reviews_to_int(_first_text(doc, REVIEWS_PATH)),
+        "image": image,
+    }
+
+def parse_search_links(raw, base: str, limit: int = 24) -> List[str]:
+    """Collect '/dp/' links from a search results page, card links first."""
+    doc = parse_html(raw) if isinstance(raw, str) else raw
+    links: List[str] = []
+
+    # Preferred: links inside result cards with data-asin
+    for card in CARD_PATH(doc):
+        hrefs = CARD_LINK_PATH(card)
+        if not hrefs:
+            continue
+        href = urljoin(base, hrefs[0]) if hrefs[0].startswith("/") else hrefs[0]
+        if "/dp/" in href:
+            links.append(href)
+        if len(links) >= limit:
+            break
+
+    # Fallback: any anchor containing '/dp/'
+    if len(links) < 5:
+        seen = set(links)
+        for href in ANY_DP_PATH(doc):
+            if href.startswith("/"):
+                href = urljoin(base, href)
+            if href in seen:
+                continue
+            links.append(href)
+            seen.add(href)
+            if len(links) >= limit:
+                break
+    return links
+
+def _unwrap_sponsored(href: str) -> str:
+    """Sponsored cards link to /sspa/click?...&url=/<slug>/dp/<ASIN>/...; return the inner link."""
+    if "/sspa/click" not in href:
+        return href
+    inner = parse_qs(urlparse(href).query).get("url")
+    return inner[0] if inner else href
+
+def parse_search_cards(raw, base: str, limit: int = 24) -> List[Dict]:
+    """Build one dict per search result card from the grid alone (no PDP visit).
+
+    Keys: asin, title, product_link, price, original_price, discount_pct, rating, reviews, image.
+    Any of them may be None when the card does not show it. Prices are read in the
+    locale of `base`'s Amazon domain.
+    """
+    doc = parse_html(raw) if isinstance(raw, str) else raw
+    country = country_of(base)
+    cards: List[Dict] = []
+    for card in CARD_PATH(doc):
+        asin = card.get("data-asin")
+        if not asin:
+            continue
+        hrefs = CARD_LINK_PATH(card)
+        link = _unwrap_sponsored(hrefs[0]) if hrefs else None
+        if link and link.startswith("/"):
+            link = urljoin(base, link)
+        if link and "/dp/" not in link:
+            link = None
+
+        price = price_to_float(_first_text(card, CARD_PRICE_PATH), country)
+        original = price_to_float(_first_text(card, CARD_ORIG_PATH), country)
+        if original is not None and original == price:
+            original = None
+        reviews = CARD_REVIEWS_PATH(card)
+        images = CARD_IMAGE_PATH(card)
+        cards.append({
+            "asin": asin,
+            "title": _first_text(card, CARD_TITLE_PATH),
+            "product_link": link,
+            "price": price,
+            "original_price": original,
+            "discount_pct": discount_pct(price, original),
+            "rating": rating_to_float(_first_text(card, CARD_RATING_PATH)),
+            "reviews": reviews_to_int(reviews[0]) if reviews else None,
+            "image": images[0] if images else None,
+        })
+        if len(cards) >= limit:
+            break
+    return cards
+
+def is_captcha(raw) -> bool:
+    doc = parse_html(raw) if isinstance(raw, str) else raw
+    return bool(CAPTCHA_PATH(doc))
+
+def parse_text(raw: str, kind: str = "auto", base: str = "https://www.amazon.fr") -> Dict:
+    doc = parse_html(raw)
+    if kind == "auto":
+        kind = "pdp" if TITLE_PATH(doc) else "search"
+    if kind == "pdp":
+        return {"kind": kind, **parse_pdp(doc, country_of(base))}
+    if kind == "cards":
+        return {"kind": kind, "cards": parse_search_cards(doc, base)}
+    return {"kind": kind, "links": parse_search_links(doc, base)}
+
+def parse_file(path: str, kind: str = "auto", base: str = "https://www.amazon.fr") -> Dict:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    return {"file": path, **parse_text(raw, kind, base)}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-parse saved Amazon HTML without a browser.")
+    parser.add_argument("paths", nargs="+", help="HTML files or glob patterns")
+    parser.add_argument("--kind", choices=["auto", "search", "cards", "pdp"], default="auto")
+    parser.add_argument("--base", default="https://www.amazon.fr", help="base URL for relative links")
+    args = parser.parse_args()
+    files = [f for p in args.paths for f in (sorted(glob.glob(p)) or [p])]
+    for f in files:
+        sys.stdout.write(json.dumps(parse_file(f, args.kind, args.base), ensure_ascii=False) + "\n")
@@ -0,0 +1,196 @@
+# scraper/fetch.py
+# Failure handling for page loads. Every failed load is classified (timeout, captcha,
+# http_503/http_429, http_error, no_grid, missing_price, error) and counted per domain;
+# retryable kinds are retried with exponential backoff + jitter, PDPs through a retry
+# queue so other links keep flowing meanwhile. A per-domain circuit breaker watches the
+# share of blocked loads (captcha, 503, 429) over the last SCRAPER_BREAKER_WINDOW loads and
+# pauses every crawl on that domain when it spikes, for a cooldown that doubles while the
+# block persists; one probe load then decides whether to resume.
+
+import os, time, random, asyncio
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from playwright.async_api import TimeoutError as PWTimeout
+from scraper import telemetry
+
+RETRIES         = int(os.getenv("SCRAPER_RETRIES", "3"))            # extra attempts per page
+BACKOFF_BASE    = float(os.getenv("SCRAPER_BACKOFF_BASE", "2"))     # seconds before the 1st retry
+BACKOFF_MAX     = float(os.getenv("SCRAPER_BACKOFF_MAX", "60"))
+RETRY_ON        = set(os.getenv("SCRAPER_RETRY_ON", "timeout,captcha,http_503,http_429,error").split(","))
+BREAKER_WINDOW  = int(os.getenv("SCRAPER_BREAKER_WINDOW", "20"))    # recent loads per domain
+BREAKER_MIN     = int(os.getenv("SCRAPER_BREAKER_MIN", "6"))        # loads needed before it can trip
+BREAKER_RATIO   = float(os.getenv("SCRAPER_BREAKER_RATIO", "0.5"))  # blocked share that trips it
+BREAKER_COOLDOWN     = float(os.getenv("SCRAPER_BREAKER_COOLDOWN", "120"))
+BREAKER_COOLDOWN_MAX = float(os.getenv("SCRAPER_BREAKER_COOLDOWN_MAX", "900"))
+PROBE_TIMEOUT   = 90.0   # a probe that never reports back stops holding the others after this
+
+BLOCK_KINDS = {"captcha", "http_503", "http_429"}
+
+FAILURES_TOTAL = telemetry.registry.counter("scraper_fetch_failures_total", "Failed page loads by kind and domain.")
+RETRIES_TOTAL  = telemetry.registry.counter("scraper_fetch_retries_total", "Page loads retried, by kind and domain.")
+BREAKER_TRIPS  = telemetry.registry.counter("scraper_breaker_trips_total", "Circuit breaker openings by domain.")
+PAUSED_SECONDS = telemetry.registry.counter("scraper_breaker_paused_seconds_total",
+                                            "Time crawls spent waiting on an open breaker, by domain.")
+
+class FetchError(Exception):
+    """A failed page load, with its failure kind."""
+
+    def __init__(self, kind: str, url: str = "", detail: str = ""):
+        super().__init__(f"{kind} {url}" + (f" ({detail})" if detail else ""))
+        self.kind, self.url = kind, url
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRY_ON
+
+def classify(exc: BaseException, url: str = "") -> FetchError:
+    if isinstance(exc, FetchError):
+        return exc
+    if isinstance(exc, (PWTimeout, asyncio.TimeoutError)):
+        return FetchError("timeout", url)
+    return FetchError("error", url, f"{exc.__class__.__name__}: {exc}")
+
+def check_response(response, url: str):
+    """Raise for a blocking or failed HTTP status (None = served from cache/same document)."""
+    if response is None or response.status < 400:
+        return
+    status = response.status
+    kind = {503: "http_503", 429: "http_429"}.get(status, "http_error")
+    raise FetchError(kind, url, f"HTTP {status}")
+
+def backoff(attempt: int) -> float:
+    """Delay before retry number `attempt` (1-based): base * 2^(n-1), capped, with ±50% jitter."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+class CircuitBreaker:
+    """Per-domain breaker over the blocked share of the last `window` page loads."""
+
+    def __init__(self, window: int = BREAKER_WINDOW, min_samples: int = BREAKER_MIN,
+                 ratio: float = BREAKER_RATIO, cooldown: float = BREAKER_COOLDOWN,
+                 max_cooldown: float = BREAKER_COOLDOWN_MAX):
+        self.window, self.min_samples, self.ratio = window, min_samples, ratio
+        self.cooldown, self.max_cooldown = cooldown, max_cooldown
+        self._recent: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._open_until: Dict[str, float] = {}
+        self._next_cooldown: Dict[str, float] = {}
+        self._probing: Dict[str, float] = {}   # domain -> when its half-open probe started
+
+    def is_open(self, domain: str) -> bool:
+        return time.monotonic() < self._open_until.get(domain, 0.0)
+
+    async def wait(self, domain: str):
+        """Block while the domain's breaker is open; after a trip only one probe goes first."""
+        t0 = time.monotonic()
+        while True:
+            delay = self._open_until.get(domain, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            started = self._probing.get(domain)
+            if not started or time.monotonic() - started > PROBE_TIMEOUT:
+                break
+            await asyncio.sleep(1.0)   # half-open: wait for the probe's outcome
+        if domain in self._next_cooldown and not self._probing.get(domain):
+            self._probing[domain] = time.monotonic()   # tripped before: this load is the probe
+        waited = time.monotonic() - t0
+        if waited > 0.01:
+            PAUSED_SECONDS.inc(waited, domain=domain)
+
+    def record(self, domain: str, kind: Optional[str] = None):
+        """Outcome of one load: kind None for success, else the failure kind."""
+        blocked = kind in BLOCK_KINDS
+        recent = self._recent[domain]
+        recent.append(blocked)
+        if self._probing.pop(domain, None):
+            if not blocked:                       # probe went through: close
+                self._next_cooldown.pop(domain, None)
+                recent.clear()
+                print(f"🟢 [{domain}] circuit closed, resuming")
+                return
+            self._trip(domain, "probe blocked")
+            return
+        if self.is_open(domain) or len(recent) < self.min_samples:
+            return
+        share = sum(recent) / len(recent)
+        if share >= self.ratio:
+            self._trip(domain, f"{share:.0%} of the last {len(recent)} loads blocked")
+
+    def _trip(self, domain: str, why: str):
+        cooldown = self._next_cooldown.get(domain, self.cooldown)
+        self._open_until[domain] = time.monotonic() + cooldown
+        self._next_cooldown[domain] = min(self.max_cooldown, cooldown * 2)
+        BREAKER_TRIPS.inc(domain=domain)
+        telemetry.log.emit("breaker_open", domain=domain, reason=why, cooldown_s=cooldown)
+        print(f"⛔ [{domain}] circuit open ({why}); pausing {cooldown:.0f}s")
+
+breaker = CircuitBreaker()   # shared by every crawl in the process
+
+def note_failure(err: FetchError, domain: str):
+    FAILURES_TOTAL.inc(kind=err.kind, domain=domain)
+    breaker.record(domain, err.kind)
+    telemetry.log.emit("fetch_failure", kind=err.kind, domain=domain, url=err.url)
+
+def print_summary():
+    kinds: Dict[str, float] = defaultdict(float)
+    for labels, n in FAILURES_TOTAL.values.items():
+        kinds[dict(labels)["kind"]] += n
+    if kinds:
+        retried = sum(RETRIES_TOTAL.values.values())
+        trips = sum(BREAKER_TRIPS.values.values())
+        paused = sum(PAUSED_SECONDS.values.values())
+        print(f"   failed loads: {', '.join(f'{k}={v:g}' for k, v in sorted(kinds.items()))}; "
+              f"retried {retried:g}, breaker tripped {trips:g}x ({paused:.0f}s paused)")
+
+T = TypeVar("T")
+
+async def retrying(load: Callable[[], Awaitable[T]], url: str, domain: str,
+                   retries: int = RETRIES) -> T:
+    """Run one page load with breaker gating and backoff retries; raises the last FetchError."""
+    attempt = 0
+    while True:
+        await breaker.wait(domain)
+        try:
+            result = await load()
+        except Exception as e:
+            err = classify(e, url)
+            note_failure(err, domain)
+            attempt += 1
+            if not err.retryable or attempt > retries:
+                raise err
+            delay = backoff(attempt)
+            RETRIES_TOTAL.inc(kind=err.kind, domain=domain)
+            print(f"↻ {err.kind} on {url}; retry {attempt}/{retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record(domain)
+        return result
+
+class RetryQueue:
+    """Work queue whose failed items come back after a delay.
+
+    `get()` returns None once every item is done (succeeded or given up), so workers can
+    simply loop until then; items waiting for their retry keep the queue open.
+    """
+
+    def __init__(self, items):
+        self._q: asyncio.Queue = asyncio.Queue()
+        self._open = 0
+        for it in items:
+            self._q.put_nowait(it)
+            self._open += 1
+        if not self._open:
+            self._q.put_nowait(None)
+
+    async def get(self):
+        item = await self._q.get()
+        if item is None:
+            self._q.put_nowait(None)   # wake the next worker too
+        return item
+
+    def done(self):
+        self._open -= 1
+        if self._open == 0:
+            self._q.put_nowait(None)
+
+    def retry(self, item, delay: float):
+        asyncio.get_running_loop().call_later(delay, self._q.put_nowait, item)
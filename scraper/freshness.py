@@ -0,0 +1,55 @@
+# scraper/freshness.py
+# Incremental recrawl: PDPs scraped less than SCRAPER_FRESH_HOURS ago are skipped, unless
+# the search card shows a different price than the stored product. Stored state comes from
+# one batched (source, asin) lookup per crawl; save_many() stamps `last_scraped_at`
+# on every written product. 0 (the default) visits every PDP, as before.
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from common.asin import asin_from_url
+from common.db import get_collection
+
+FRESH_HOURS = float(os.getenv("SCRAPER_FRESH_HOURS", "0"))
+
+async def stored_state(source: str, asins: List[str], col=None) -> Dict[str, Dict]:
+    """{asin: {"price", "last_scraped_at"}} for the products already stored."""
+    col = col if col is not None else get_collection()
+    if not asins:
+        return {}
+    cur = col.find({"source": source, "asin": {"$in": list(set(asins))}},
+                   {"_id": 0, "asin": 1, "price": 1, "last_scraped_at": 1})
+    return {d["asin"]: d async for d in cur}
+
+def stale_reason(stored: Optional[Dict], card_price: Optional[float], cutoff: datetime) -> Optional[str]:
+    """Why a PDP must be visited ("new", "expired", "price"), or None when it is fresh."""
+    if stored is None:
+        return "new"
+    ts = stored.get("last_scraped_at")
+    if ts is None:
+        return "expired"
+    if ts.tzinfo is None:            # pymongo returns naive UTC datetimes by default
+        ts = ts.replace(tzinfo=timezone.utc)
+    if ts < cutoff:
+        return "expired"
+    if card_price is not None and card_price != stored.get("price"):
+        return "price"
+    return None
+
+async def select_stale(links: List[str], card_prices: Dict[str, Optional[float]], source: str,
+                       fresh_hours: float, col=None) -> Tuple[List[str], Counter]:
+    """Keep the links worth visiting; the Counter holds why (plus "fresh" for the skipped)."""
+    reasons: Counter = Counter()
+    if fresh_hours <= 0 or not links:
+        return links, reasons
+    asins = [asin_from_url(l) for l in links]
+    state = await stored_state(source, [a for a in asins if a], col)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=fresh_hours)
+    keep = []
+    for link, asin in zip(links, asins):
+        why = stale_reason(state.get(asin), card_prices.get(asin), cutoff) if asin else "new"
+        reasons[why or "fresh"] += 1
+        if why:
+            keep.append(link)
+    return keep, reasons
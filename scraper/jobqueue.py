@@ -0,0 +1,154 @@
+# scraper/jobqueue.py
+# Crawl jobs shared by any number of worker processes (scraper/worker.py), stored in Mongo.
+# A worker leases one job at a time with an atomic find_one_and_update: the job becomes
+# "leased" by that worker until `lease_until`, which the worker keeps pushing back while
+# it works. A worker that dies simply lets the lease expire and the job is handed out
+# again; failures are re-queued with backoff until SCRAPER_JOB_MAX_ATTEMPTS.
+#
+# Job ids are deterministic (search:<domain>:<query>:<page>, pdp:<domain>:<asin>), so
+# enqueueing a product that is already queued or being crawled is a no-op: that is the
+# in-flight dedup. Finished PDP jobs are only re-queued once they are older than
+# SCRAPER_JOB_REQUEUE_MINUTES.
+
+import os, uuid, socket
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from common.db import get_collection
+
+JOBS_COLL       = os.getenv("MONGO_JOBS_COLLECTION", "crawl_jobs")
+VISIBILITY_SECS = float(os.getenv("SCRAPER_JOB_VISIBILITY_SECS", "300"))
+MAX_ATTEMPTS    = int(os.getenv("SCRAPER_JOB_MAX_ATTEMPTS", "4"))
+REQUEUE_MINUTES = float(os.getenv("SCRAPER_JOB_REQUEUE_MINUTES", "60"))
+
+JOB_INDEXES = [
+    IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("not_before", ASCENDING)],
+               name="status_priority_not_before"),
+    IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+]
+
+def jobs_collection():
+    return get_collection(JOBS_COLL)
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def search_job(query: str, domain: str, page: int, priority: int = 0, mode: str = "pdp",
+               fresh_hours: float = 0) -> Dict:
+    return {"_id": f"search:{domain}:{query}:{page}", "kind": "search", "domain": domain,
+            "query": query, "page": page, "priority": priority, "mode": mode, "fresh_hours": fresh_hours}
+
+def pdp_job(url: str, asin: str, domain: str, query: str, priority: int = 0) -> Dict:
+    return {"_id": f"pdp:{domain}:{asin}", "kind": "pdp", "domain": domain, "url": url,
+            "asin": asin, "query": query, "priority": priority}
+
+async def ensure_indexes(col=None) -> List[str]:
+    col = col if col is not None else jobs_collection()
+    return await col.create_indexes(JOB_INDEXES)
+
+async def enqueue(jobs: Iterable[Dict], requeue_after_minutes: float = REQUEUE_MINUTES, col=None) -> int:
+    """Add jobs; ids already queued or leased are left alone. Returns how many were (re)queued.
+
+    A finished (done/failed) job is queued again when it finished more than
+    `requeue_after_minutes` ago (0: always).
+    """
+    col = col if col is not None else jobs_collection()
+    now = _now()
+    ops = []
+    for job in jobs:
+        fields = {k: v for k, v in job.items() if k != "_id"}
+        fresh = {"status": "queued", "attempts": 0, "not_before": now, "queued_at": now,
+                 "lease_until": None, "worker": None, "error": None}
+        ops.append(UpdateOne({"_id": job["_id"]}, {"$setOnInsert": {**fields, **fresh}}, upsert=True))
+        finished = {"_id": job["_id"], "status": {"$in": ["done", "failed"]}}
+        if requeue_after_minutes > 0:
+            finished["finished_at"] = {"$lt": now - timedelta(minutes=requeue_after_minutes)}
+        ops.append(UpdateOne(finished, {"$set": {**fields, **fresh}}))
+    if not ops:
+        return 0
+    try:
+        res = await col.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Two workers upserting the same new id at once: one insert loses the race, which
+        # is exactly the dedup we want. Anything else is a real error.
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nUpserted", 0) + e.details.get("nModified", 0)
+    return (res.upserted_count or 0) + (res.modified_count or 0)
+
+async def lease(worker: str, kinds: Optional[List[str]] = None, domain: Optional[str] = None,
+                visibility: float = VISIBILITY_SECS, col=None) -> Optional[Dict]:
+    """Atomically take the best ready job (highest priority, then oldest): queued and due,
+    or leased by someone whose lease has expired."""
+    col = col if col is not None else jobs_collection()
+    now = _now()
+    q: Dict = {"$or": [{"status": "queued", "not_before": {"$lte": now}},
+                       {"status": "leased", "lease_until": {"$lt": now}}],
+               "attempts": {"$lt": MAX_ATTEMPTS}}
+    if kinds:
+        q["kind"] = {"$in": kinds}
+    if domain:
+        q["domain"] = domain
+    return await col.find_one_and_update(
+        q,
+        {"$set": {"status": "leased", "worker": worker, "leased_at": now,
+                  "lease_until": now + timedelta(seconds=visibility)},
+         "$inc": {"attempts": 1}},
+        sort=[("priority", DESCENDING), ("not_before", ASCENDING)],
+        return_document=ReturnDocument.AFTER)
+
+async def extend(job_id: str, worker: str, visibility: float = VISIBILITY_SECS, col=None) -> bool:
+    """Push the lease back; False when the job is no longer ours (lease expired and re-taken)."""
+    col = col if col is not None else jobs_collection()
+    res = await col.update_one({"_id": job_id, "status": "leased", "worker": worker},
+                               {"$set": {"lease_until": _now() + timedelta(seconds=visibility)}})
+    return res.matched_count == 1
+
+async def complete(job_ids: List[str], worker: str, result: Optional[Dict] = None, col=None) -> int:
+    col = col if col is not None else jobs_collection()
+    if not job_ids:
+        return 0
+    res = await col.update_many({"_id": {"$in": job_ids}, "status": "leased", "worker": worker},
+                                {"$set": {"status": "done", "finished_at": _now(), "lease_until": None,
+                                          "error": None, "result": result}})
+    return res.modified_count
+
+async def fail(job: Dict, worker: str, error: str, retry_in: Optional[float], col=None):
+    """Re-queue after `retry_in` seconds, or mark failed (retry_in None, or out of attempts)."""
+    col = col if col is not None else jobs_collection()
+    now = _now()
+    if retry_in is not None and job.get("attempts", 0) < MAX_ATTEMPTS:
+        update = {"status": "queued", "not_before": now + timedelta(seconds=retry_in)}
+    else:
+        update = {"status": "failed", "finished_at": now}
+    await col.update_one({"_id": job["_id"], "status": "leased", "worker": worker},
+                         {"$set": {**update, "lease_until": None, "error": error}})
+
+async def release(job_ids: List[str], worker: str, col=None):
+    """Hand unfinished jobs back right away (worker shutting down); the attempt isn't counted."""
+    col = col if col is not None else jobs_collection()
+    if job_ids:
+        await col.update_many({"_id": {"$in": job_ids}, "status": "leased", "worker": worker},
+                              {"$set": {"status": "queued", "not_before": _now(), "lease_until": None,
+                                        "worker": None}, "$inc": {"attempts": -1}})
+
+async def reap(col=None) -> int:
+    """Mark jobs whose last lease expired with no attempts left as failed."""
+    col = col if col is not None else jobs_collection()
+    res = await col.update_many({"status": "leased", "lease_until": {"$lt": _now()},
+                                 "attempts": {"$gte": MAX_ATTEMPTS}},
+                                {"$set": {"status": "failed", "finished_at": _now(),
+                                          "error": "lease expired, no attempts left"}})
+    return res.modified_count
+
+async def counts(col=None) -> Dict[str, Dict[str, int]]:
+    """{kind: {status: n}}"""
+    col = col if col is not None else jobs_collection()
+    out: Dict[str, Dict[str, int]] = {}
+    async for r in col.aggregate([{"$group": {"_id": {"kind": "$kind", "status": "$status"}, "n": {"$sum": 1}}}]):
+        out.setdefault(r["_id"]["kind"], {})[r["_id"]["status"]] = r["n"]
+    return out
@@ -0,0 +1,97 @@
+# scraper/pipeline.py
+# Streaming write path: parsed products go through a bounded asyncio queue into a batched
+# writer, so documents reach Mongo while the crawl is still running and a crash only
+# loses the batch in flight. A full queue makes the fetchers wait (backpressure).
+
+import os, json, time, asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BATCH_SIZE  = int(os.getenv("SCRAPER_BATCH_SIZE", "25"))
+FLUSH_SECS  = float(os.getenv("SCRAPER_FLUSH_SECS", "5"))
+QUEUE_MAX   = int(os.getenv("SCRAPER_QUEUE_MAX", "100"))
+FALLBACK_DIR = os.getenv("SCRAPER_FALLBACK_DIR", os.path.join("data", "out"))
+
+@dataclass
+class WriterStats:
+    received: int = 0
+    batches: int = 0
+    changed: int = 0
+    failed_batches: int = 0
+    fallback_files: List[str] = field(default_factory=list)
+
+class BatchWriter:
+    """Collects documents from `put()` and hands them to `save(batch)` by size or interval.
+
+    If `save` raises (Mongo down, network error...), that batch is written to a JSON file
+    under FALLBACK_DIR instead, and the crawl carries on.
+    """
+
+    _STOP = object()
+
+    def __init__(self, save: Callable[[List[Dict]], Awaitable[int]], batch_size: int = BATCH_SIZE,
+                 flush_secs: float = FLUSH_SECS, queue_max: int = QUEUE_MAX,
+                 fallback_dir: str = FALLBACK_DIR):
+        self.save = save
+        self.batch_size = max(1, batch_size)
+        self.flush_secs = flush_secs
+        self.fallback_dir = fallback_dir
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+        self.stats = WriterStats()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "BatchWriter":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def put(self, doc: Dict):
+        """Enqueue one document; waits while the queue is full."""
+        self.stats.received += 1
+        await self.queue.put(doc)
+
+    async def close(self) -> WriterStats:
+        """Flush what is left and stop the writer task."""
+        if self._task:
+            await self.queue.put(self._STOP)
+            await self._task
+            self._task = None
+        return self.stats
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch: List[Dict] = []
+        deadline = loop.time() + self.flush_secs
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                item = None
+            if item is self._STOP:
+                await self._flush(batch)
+                return
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or loop.time() >= deadline:
+                await self._flush(batch)
+                batch = []
+                deadline = loop.time() + self.flush_secs
+
+    async def _flush(self, batch: List[Dict]):
+        if not batch:
+            return
+        self.stats.batches += 1
+        try:
+            self.stats.changed += await self.save(batch)
+        except Exception as e:
+            self.stats.failed_batches += 1
+            path = await asyncio.to_thread(self._dump, batch)
+            self.stats.fallback_files.append(path)
+            print(f"⚠️ Mongo write failed ({e.__class__.__name__}). Saved {len(batch)} docs to {path}")
+
+    def _dump(self, batch: List[Dict]) -> str:
+        os.makedirs(self.fallback_dir, exist_ok=True)
+        path = os.path.join(self.fallback_dir,
+                            f"scraped_{time.strftime('%Y%m%d_%H%M%S')}_{self.stats.batches:04d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(batch, f, ensure_ascii=False, indent=2, default=str)
+        return path
@@ -0,0 +1,234 @@
+# scraper/scheduler.py
+# Crawl many (query, domain) jobs with one browser. Each Amazon domain gets one context
+# (cookie banner and locale handled once), jobs run concurrently under a global and a
+# per-domain limit, and all products go through one batched Mongo writer. Job state
+# (last run, outcome, item count, next due time) is saved to a JSON file after every
+# change, so an interrupted run resumes with what was not finished, and jobs are only
+# re-crawled once their refresh interval has passed.
+#
+#   python -m scraper.scheduler scraper/jobs.example.json --max-jobs 4 --per-domain 2
+#   python -m scraper.scheduler jobs.json --loop          # keep running, re-crawl when due
+#   python -m scraper.scheduler jobs.json --status        # print the saved job state
+#
+# Job file: a JSON list (or one object per line) of
+#   {"query": "ssd 1to", "domain": "fr", "pages": 2, "priority": 5, "refresh_hours": 12,
+#    "mode": "cards", "fresh_hours": 6}
+# Only `query` is required; domain defaults to SCRAPER_COUNTRY_DOMAIN.
+
+import os, json, time, asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from playwright.async_api import async_playwright
+from scraper.pipeline import BatchWriter
+from scraper.waits import wait_stats
+from scraper import archive, fetch, telemetry
+from scraper.scrape_amazon_playwright import (COUNTRY, CONCURRENCY, CONTEXTS, HOST_RPS, MODE,
+                                              BLOCK_RESOURCES, BROWSER_ENDPOINT, SESSION_DIR,
+                                              _HostRateLimiter, crawl, launch_browser, open_site,
+                                              print_site_summary, save_many, save_session)
+from scraper.freshness import FRESH_HOURS
+
+STATE_FILE    = os.getenv("SCHEDULER_STATE_FILE", os.path.join("data", "scheduler_state.json"))
+MAX_JOBS      = int(os.getenv("SCHEDULER_MAX_JOBS", "4"))      # jobs crawling at once
+PER_DOMAIN    = int(os.getenv("SCHEDULER_PER_DOMAIN", "2"))    # of which on the same domain
+REFRESH_HOURS = float(os.getenv("SCHEDULER_REFRESH_HOURS", "24"))
+RETRY_MINUTES = float(os.getenv("SCHEDULER_RETRY_MINUTES", "30"))  # failed jobs are retried after this
+POLL_SECS     = float(os.getenv("SCHEDULER_POLL_SECS", "60"))
+
+@dataclass
+class Job:
+    query: str
+    domain: str = COUNTRY
+    pages: int = 1
+    priority: int = 0
+    refresh_hours: float = REFRESH_HOURS
+    mode: str = MODE
+    fresh_hours: float = FRESH_HOURS   # skip PDPs scraped more recently (scraper/freshness.py)
+
+    @property
+    def id(self) -> str:
+        return f"{self.domain}:{self.query}"
+
+def _domain(value: str) -> str:
+    """'fr', 'amazon.fr', 'www.amazon.fr' -> 'fr'."""
+    value = value.strip().lower()
+    for prefix in ("https://", "http://", "www.", "amazon."):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    return value.rstrip("/")
+
+def load_jobs(path: str) -> List[Job]:
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    items = items if isinstance(items, list) else [items]
+    jobs: Dict[str, Job] = {}
+    for it in items:
+        job = Job(**{**it, "domain": _domain(it.get("domain") or COUNTRY)})
+        jobs[job.id] = job   # a repeated (domain, query) keeps the last definition
+    return list(jobs.values())
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+class JobState:
+    """Per-job run record persisted as JSON: {job id: {status, started, finished, items, runs, error}}."""
+
+    def __init__(self, path: str = STATE_FILE):
+        self.path = path
+        self.jobs: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.jobs = json.load(f)
+        self._lock = asyncio.Lock()
+
+    def next_due(self, job: Job) -> datetime:
+        s = self.jobs.get(job.id)
+        if not s or s.get("status") == "running" or not s.get("finished"):
+            return datetime.min.replace(tzinfo=timezone.utc)   # never ran, or interrupted mid-run
+        wait = (timedelta(hours=job.refresh_hours) if s["status"] == "ok"
+                else min(timedelta(minutes=RETRY_MINUTES), timedelta(hours=job.refresh_hours)))
+        return _ts(s["finished"]) + wait
+
+    def due(self, jobs: List[Job], now: datetime) -> List[Job]:
+        ready = [j for j in jobs if self.next_due(j) <= now]
+        # Highest priority first, then whichever has waited longest.
+        return sorted(ready, key=lambda j: (-j.priority, self.jobs.get(j.id, {}).get("finished") or ""))
+
+    async def update(self, job: Job, **fields):
+        async with self._lock:
+            self.jobs[job.id] = {**self.jobs.get(job.id, {}), "query": job.query, "domain": job.domain, **fields}
+            await asyncio.to_thread(self._save, json.loads(json.dumps(self.jobs)))
+
+    def _save(self, snapshot: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+class Scheduler:
+    def __init__(self, jobs: List[Job], state: JobState, max_jobs: int = MAX_JOBS,
+                 per_domain: int = PER_DOMAIN, concurrency: int = CONCURRENCY,
+                 contexts: int = CONTEXTS, host_rps: float = HOST_RPS, block: bool = BLOCK_RESOURCES,
+                 session_dir: str = SESSION_DIR, endpoint: str = BROWSER_ENDPOINT):
+        self.jobs, self.state = jobs, state
+        self.concurrency, self.contexts, self.block = concurrency, contexts, block
+        self.session_dir, self.endpoint = session_dir, endpoint
+        self.limiter = _HostRateLimiter(host_rps)   # shared: the rate limit is per host, not per job
+        self.slots = asyncio.Semaphore(max(1, max_jobs))
+        self.domain_slots = defaultdict(lambda: asyncio.Semaphore(max(1, per_domain)))
+        self.sites: Dict[str, object] = {}
+        self._site_locks = defaultdict(asyncio.Lock)
+
+    async def _site(self, browser, domain: str):
+        async with self._site_locks[domain]:
+            if domain not in self.sites:
+                self.sites[domain] = await open_site(browser, domain, self.block, self.session_dir)
+            return self.sites[domain]
+
+    async def _run_job(self, browser, writer: BatchWriter, job: Job):
+        async with self.domain_slots[job.domain], self.slots:
+            items = 0
+
+            async def sink(doc: Dict):
+                nonlocal items
+                items += 1
+                await writer.put(doc)
+
+            runs = self.state.jobs.get(job.id, {}).get("runs", 0) + 1
+            await self.state.update(job, status="running", started=_now().isoformat(), runs=runs)
+            print(f"▶️ [{job.id}] pages={job.pages} mode={job.mode}")
+            try:
+                site = await self._site(browser, job.domain)
+                await crawl(browser, site, job.query, job.pages, self.concurrency, self.contexts,
+                            self.limiter, job.mode, sink, job.fresh_hours)
+            except Exception as e:
+                await self.state.update(job, status="error", finished=_now().isoformat(), items=items,
+                                        error=f"{e.__class__.__name__}: {e}")
+                print(f"❌ [{job.id}] {e.__class__.__name__}: {e}")
+                return
+            await self.state.update(job, status="ok", finished=_now().isoformat(), items=items, error=None)
+            print(f"✅ [{job.id}] {items} products")
+
+    async def run(self, loop: bool = False, force: bool = False, poll_secs: float = POLL_SECS):
+        t0 = time.perf_counter()
+        writer = BatchWriter(save_many).start()
+        try:
+            async with async_playwright() as p:
+                browser = await launch_browser(p, self.endpoint)
+                try:
+                    first = True
+                    while True:
+                        now = _now()
+                        due = list(self.jobs) if force and first else self.state.due(self.jobs, now)
+                        first = False
+                        if due:
+                            print(f"🗓️ {len(due)} job(s) due of {len(self.jobs)}")
+                            await asyncio.gather(*(self._run_job(browser, writer, j) for j in due))
+                        if not loop:
+                            break
+                        upcoming = [self.state.next_due(j) for j in self.jobs]
+                        wait = min([(t - _now()).total_seconds() for t in upcoming] + [poll_secs])
+                        await asyncio.sleep(max(1.0, wait))
+                finally:
+                    for site in self.sites.values():
+                        await save_session(site)
+                        print_site_summary(site)
+                    await browser.close()
+        finally:
+            stats = await writer.close()
+            telemetry.write_metrics()
+            await archive.close()
+        print(f"Scraped {stats.received} items in {stats.batches} batches, "
+              f"{stats.changed} upserted/updated.")
+        if stats.fallback_files:
+            print(f"⚠️ {stats.failed_batches} batches saved to JSON instead: {', '.join(stats.fallback_files)}")
+        print(f"⏱️ Adaptive waits saved ~{wait_stats.saved_ms() / 1000:.1f}s")
+        telemetry.print_summary(time.perf_counter() - t0)
+        fetch.print_summary()
+
+def print_status(jobs: List[Job], state: JobState):
+    now = _now()
+    print(f"{'job':<40}{'prio':>5}{'status':>9}{'items':>7}{'runs':>6}  next due")
+    for j in sorted(jobs, key=lambda j: -j.priority):
+        s = state.jobs.get(j.id, {})
+        due = state.next_due(j)
+        when = "now" if due <= now else due.strftime("%Y-%m-%d %H:%M UTC")
+        print(f"{j.id[:39]:<40}{j.priority:>5}{s.get('status', 'new'):>9}{s.get('items', 0):>7}"
+              f"{s.get('runs', 0):>6}  {when}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("jobs", help="job file (JSON list or JSON lines)")
+    parser.add_argument("--state", default=STATE_FILE, help="where job state is kept between runs")
+    parser.add_argument("--max-jobs", type=int, default=MAX_JOBS, help="jobs crawling at the same time")
+    parser.add_argument("--per-domain", type=int, default=PER_DOMAIN, help="concurrent jobs per Amazon domain")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="PDP pages per job")
+    parser.add_argument("--contexts", type=int, default=CONTEXTS, help="browser contexts per job")
+    parser.add_argument("--rps", type=float, default=HOST_RPS, help="max navigations per second per host, all jobs together")
+    parser.add_argument("--block", action=argparse.BooleanOptionalAction, default=BLOCK_RESOURCES)
+    parser.add_argument("--session-dir", default=SESSION_DIR, help="per-domain saved sessions ('' = off)")
+    parser.add_argument("--connect", default=BROWSER_ENDPOINT, help="attach to a running browser (scraper/browser_server.py)")
+    parser.add_argument("--archive", default=archive.ARCHIVE_DIR, help="archive fetched pages here (scraper/archive.py)")
+    parser.add_argument("--loop", action="store_true", help="keep running and re-crawl jobs when they are due")
+    parser.add_argument("--force", action="store_true", help="run every job now, ignoring refresh intervals")
+    parser.add_argument("--status", action="store_true", help="print job state and exit")
+    args = parser.parse_args()
+    jobs, state = load_jobs(args.jobs), JobState(args.state)
+    archive.set_archive(args.archive)
+    if args.status:
+        print_status(jobs, state)
+    else:
+        sched = Scheduler(jobs, state, args.max_jobs, args.per_domain, args.concurrency,
+                          args.contexts, args.rps, args.block, args.session_dir, args.connect)
+        asyncio.run(sched.run(loop=args.loop, force=args.force))
@@ -2,290 +2,580 @@
 # Playwright PDP scraper for Amazon search (FR-ready).
 # Educational use only — respect site policies.
 
-import os, asyncio
-from typing import List, Dict, Optional, Tuple
-from urllib.parse import quote_plus, urljoin
+import os, json, time, asyncio
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Dict, Optional
+from urllib.parse import quote_plus, urlparse
 from dotenv import load_dotenv
 from pymongo import UpdateOne
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
 from common.db import get_collection
+from common.indexes import ensure_all_indexes
+from common.history import record_changes
+from common.version import bump_version
+from common.leaderboard import apply_batch
+from scraper.extract import (parse_html, parse_pdp, parse_search_links, parse_search_cards, is_captcha,
+                             asin_from_url, canonical_link)
+from scraper.blocking import ResourceBlocker, BLOCK_RESOURCES
+from scraper.waits import cookie_gate, scroll_until_stable, wait_pdp_ready, wait_stats
+from scraper.pipeline import BatchWriter, BATCH_SIZE, FLUSH_SECS
+from scraper.freshness import FRESH_HOURS, select_stale
+from scraper import archive, fetch, telemetry
+from scraper.fetch import FetchError
+from scraper.telemetry import stage
 
 load_dotenv()
 
 COUNTRY  = os.getenv("SCRAPER_COUNTRY_DOMAIN", "fr")
-BASE     = f"https://www.amazon.{COUNTRY}"
+BASE     = f"https://www.amazon.{COUNTRY}"                      # default site; pass `country` for others
 BROWSER  = os.getenv("SCRAPER_BROWSER", "firefox").lower()   # "firefox" or "chromium"
 HEADLESS = os.getenv("SCRAPER_HEADLESS", "false").lower() in ("1", "true", "yes")
 SLOW_MO  = int(os.getenv("SCRAPER_SLOW_MO", "150"))
 MAX_LINKS_PER_PAGE = int(os.getenv("SCRAPER_MAX_LINKS", "24"))
-
-def _price_to_float(s: Optional[str]) -> Optional[float]:
-    if not s:
-        return None
-    s = s.strip().replace("\xa0", " ").replace("\u202f", " ")
-    digits = "".join(ch for ch in s if (ch.isdigit() or ch in ".,"))
-    if not digits:
-        return None
-    try:
-        return float(digits.replace(",", "."))
-    except:
-        return None
+CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", "4"))       # PDP pages open at once
+CONTEXTS    = int(os.getenv("SCRAPER_CONTEXTS", "1"))          # browser contexts shared by the workers
+HOST_RPS    = float(os.getenv("SCRAPER_HOST_RPS", "2"))        # max navigations/s per host (0 = unlimited)
+MODE        = os.getenv("SCRAPER_MODE", "pdp")                 # "pdp": visit every product, "cards": search grid only
+# Warm starts: cookies/localStorage saved per domain after the consent dance ("" = off), reused
+# while younger than SCRAPER_SESSION_MAX_HOURS; and an optional already-running browser to
+# attach to instead of launching one (http://... = Chromium CDP, ws://... = Playwright server).
+SESSION_DIR       = os.getenv("SCRAPER_SESSION_DIR", os.path.join("data", "browser_state"))
+SESSION_MAX_HOURS = float(os.getenv("SCRAPER_SESSION_MAX_HOURS", "72"))
+BROWSER_ENDPOINT  = os.getenv("SCRAPER_BROWSER_ENDPOINT", "")
+REQUIRED_FIELDS = ("title", "price")                           # a card missing one of these falls back to its PDP
+GRID_SELECTOR    = "div.s-result-item[data-component-type='s-search-result']"
+CAPTCHA_SELECTOR = "form[action*='validateCaptcha'], #captchacharacters"
+
+# Country domain -> (browser locale, Amazon lc-main, i18n-prefs currency).
+LOCALES = {
+    "fr": ("fr-FR", "fr_FR", "EUR"), "de": ("de-DE", "de_DE", "EUR"), "it": ("it-IT", "it_IT", "EUR"),
+    "es": ("es-ES", "es_ES", "EUR"), "nl": ("nl-NL", "nl_NL", "EUR"), "co.uk": ("en-GB", "en_GB", "GBP"),
+    "com": ("en-US", "en_US", "USD"),
+}
+
+def base_url(country: str) -> str:
+    return f"https://www.amazon.{country}"
+
+async def _dump(path: str, html: str):
+    """Debug copy of the last page, written off the event loop."""
+    def write():
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+    await asyncio.to_thread(write)
 
 async def _accept_cookies(page):
-    selectors = [
-        "#sp-cc-accept", "input#sp-cc-accept", "button[name='accept']",
-        "text=Accepter les cookies", "text=Accepter",
-        "text=J’accepte", "text=J'accepte",
-        "text=Allow all cookies", "text=Tout accepter",
-        "button:has-text('Accepter')", "button:has-text('Tout accepter')",
-    ]
-    for sel in selectors:
-        try:
-            if await page.is_visible(sel, timeout=2000):
-                await page.click(sel)
-                await page.wait_for_timeout(800)
-                print("✅ Cookies accepted via:", sel)
-                return
-        except:
-            pass
-    print("ℹ️ No cookie banner detected or already accepted.")
-
-async def _scroll(page, steps=18, dy=1600, pause=350):
-    for _ in range(steps):
-        await page.mouse.wheel(0, dy)
-        await page.wait_for_timeout(pause)
-
-async def _collect_search_links(page, query: str, page_no: int) -> List[str]:
-    """Open search page, wait for grid, deep-scroll, and collect product '/dp/' links."""
-    url = f"{BASE}/s?k={quote_plus(query)}&page={page_no}"
+    async with stage("cookies", telemetry.domain_of(page.url)):
+        await cookie_gate(page.context).accept(page)
+
+def search_url(query: str, page_no: int, country: str = COUNTRY) -> str:
+    return f"{base_url(country)}/s?k={quote_plus(query)}&page={page_no}"
+
+async def _load_search_page(page, query: str, page_no: int, country: str = COUNTRY) -> str:
+    """Open search page, wait for grid, deep-scroll, and return its HTML.
+
+    Raises FetchError for a blocked status, a robot check, or a page without a result grid.
+    """
+    url = search_url(query, page_no, country)
+    domain = telemetry.domain_of(url)
     print("[SEARCH]", url)
 
-    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    async with stage("search_goto", domain, url=url):
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    fetch.check_response(response, url)
     await _accept_cookies(page)
 
     try:
-        await page.wait_for_selector(
-            "div.s-result-item[data-component-type='s-search-result']",
-            timeout=60000
-        )
+        async with stage("grid_wait", domain, url=url):
+            # Returns as soon as either shows up, so a robot check doesn't cost the full timeout.
+            await page.wait_for_selector(f"{GRID_SELECTOR}, {CAPTCHA_SELECTOR}", timeout=60000)
     except PWTimeout:
         print("No result cards found (timeout). Dumping HTML...")
-        open("last_search.html", "w", encoding="utf-8").write(await page.content())
-        return []
-
-    await _scroll(page, steps=18)
-    open("last_search.html", "w", encoding="utf-8").write(await page.content())
-
-    links: List[str] = []
-
-    # Preferred: links inside result cards with data-asin
-    cards = await page.query_selector_all(
-        "div.s-result-item[data-component-type='s-search-result'][data-asin]"
-    )
-    for c in cards:
-        a = await c.query_selector("h2 a.a-link-normal") or await c.query_selector("h2 a")
-        if not a:
-            continue
-        href = await a.get_attribute("href")
-        if not href:
-            continue
-        if href.startswith("/"):
-            href = urljoin(BASE, href)
-        if "/dp/" in href:
-            links.append(href)
-        if len(links) >= MAX_LINKS_PER_PAGE:
-            break
-
-    # Fallback: any anchor containing '/dp/'
-    if len(links) < 5:
-        anchors = await page.query_selector_all("a[href*='/dp/']")
-        seen = set(links)
-        for a in anchors:
-            href = await a.get_attribute("href")
-            if not href:
-                continue
-            if href.startswith("/"):
-                href = urljoin(BASE, href)
-            if "/dp/" not in href or href in seen:
-                continue
-            links.append(href)
-            seen.add(href)
-            if len(links) >= MAX_LINKS_PER_PAGE:
-                break
-
+        await _dump("last_search.html", await page.content())
+        raise FetchError("no_grid", url)
+    if await page.locator(CAPTCHA_SELECTOR).count():
+        raise FetchError("captcha", url)
+
+    async with stage("scroll", domain, url=url):
+        await scroll_until_stable(page)
+    async with stage("content", domain, url=url):
+        html = await page.content()
+    archive.save(html, url, "search", query=query, domain=domain)
+    await _dump("last_search.html", html)
+    return html
+
+async def _collect_search_links(page, query: str, page_no: int, country: str = COUNTRY,
+                                prices: Optional[Dict] = None) -> List[str]:
+    """Collect product '/dp/' links from one search results page.
+
+    With `prices`, the card price of every result is added to it as {asin: price}.
+    """
+    html = await _load_search_page(page, query, page_no, country)
+    base = base_url(country)
+    async with stage("parse_search", telemetry.domain_of(base)):
+        doc = parse_html(html)   # one lxml parse for both passes
+        links = parse_search_links(doc, base, MAX_LINKS_PER_PAGE)
+        if prices is not None:
+            prices.update((c["asin"], c["price"]) for c in parse_search_cards(doc, base, MAX_LINKS_PER_PAGE))
     print(f"Collected {len(links)} PDP links on page {page_no}")
     return links
 
-async def _parse_pdp(page) -> Tuple[Optional[float], Optional[float], Optional[float],
-                                    Optional[float], Optional[int], Optional[str]]:
-    price_selectors = [
-        "#corePrice_desktop span.a-price > span.a-offscreen",
-        "span.apexPriceToPay > span.a-offscreen",
-        "span.a-price.a-text-price.a-size-medium.apexPriceToPay > span.a-offscreen",
-        "span.a-price > span.a-offscreen",
-        "#price_inside_buybox",
-    ]
-    price_txt = None
-    for sel in price_selectors:
-        try:
-            el = await page.query_selector(sel)
-            if el:
-                t = (await el.inner_text()).strip()
-                if t:
-                    price_txt = t
-                    break
-        except:
-            pass
-    price = _price_to_float(price_txt)
-
-    orig_selectors = [
-        "#corePrice_desktop span.a-text-price > span.a-offscreen",
-        "span.a-price.a-text-price > span.a-offscreen",
-        "#priceblock_ourprice",
-    ]
-    orig_txt = None
-    for sel in orig_selectors:
+async def _collect_search_cards(page, query: str, page_no: int, country: str = COUNTRY) -> List[Dict]:
+    """Collect product cards (price, rating, image...) from one search results page."""
+    html = await _load_search_page(page, query, page_no, country)
+    base = base_url(country)
+    async with stage("parse_search", telemetry.domain_of(base)):
+        cards = parse_search_cards(html, base, MAX_LINKS_PER_PAGE)
+    print(f"Collected {len(cards)} cards on page {page_no}")
+    return cards
+
+def _card_to_doc(card: Dict, query: str, country: str = COUNTRY) -> Dict:
+    return {
+        "asin": card["asin"],
+        "category": query,
+        "title": card["title"],
+        "brand": None,
+        "price": card["price"],
+        "original_price": card["original_price"],
+        "discount_pct": card["discount_pct"],
+        "rating": card["rating"],
+        "reviews": card["reviews"],
+        "product_link": canonical_link(base_url(country), card["asin"]),
+        "image": card["image"],
+        "availability": None,
+        "source": f"amazon.{country}",
+    }
+
+class _HostRateLimiter:
+    """Spaces navigations to the same host at least 1/rps seconds apart, across all workers."""
+
+    def __init__(self, rps: float):
+        self.interval = 1.0 / rps if rps and rps > 0 else 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+async def _scrape_pdp(page, link: str, query: str, country: str = COUNTRY) -> Dict:
+    """Load and parse one product page; raises FetchError when it can't yield a document."""
+    domain = telemetry.domain_of(link)
+    async with stage("pdp_goto", domain, url=link):
+        response = await page.goto(link, wait_until="domcontentloaded", timeout=60000)
+    fetch.check_response(response, link)
+    await _accept_cookies(page)
+    async with stage("pdp_ready", domain, url=link):
+        await wait_pdp_ready(page)
+
+    async with stage("content", domain, url=link):
+        html = await page.content()
+    archive.save(html, link, "pdp", asin=asin_from_url(page.url) or asin_from_url(link),
+                 query=query, domain=domain)
+    async with stage("parse_pdp", domain, url=link):
+        f = parse_pdp(html, country)
+
+    if not f["title"] or f["price"] is None:
+        if is_captcha(html):      # only checked on failure: a robot check has neither field
+            raise FetchError("captcha", link)
+        telemetry.product("incomplete", domain, url=link)
+        raise FetchError("missing_price" if f["title"] else "missing_title", link)
+    telemetry.product("ok", domain, url=link)
+    asin = asin_from_url(page.url) or asin_from_url(link)
+    return {
+        "asin": asin,
+        "category": query,
+        "title": f["title"],
+        "brand": None,
+        "price": f["price"],
+        "original_price": f["original_price"],
+        "discount_pct": f["discount_pct"],
+        "rating": f["rating"],
+        "reviews": f["reviews"],
+        "product_link": canonical_link(base_url(country), asin) if asin else link,
+        "image": f["image"],
+        "availability": None,
+        "source": f"amazon.{country}",
+    }
+
+Sink = Callable[[Dict], Awaitable[None]]
+
+async def _pdp_pool(contexts: List, links: List[str], query: str,
+                    concurrency: int, limiter: _HostRateLimiter, sink: Optional[Sink] = None,
+                    country: str = COUNTRY) -> List[Dict]:
+    """Visit `links` with `concurrency` pages spread over `contexts`, all pulling from one queue.
+
+    Results keep the order of `links`, exactly like the old serial loop. With a `sink`, each
+    product is handed over as soon as it is parsed instead (and nothing is returned); a slow
+    sink holds the worker back. Failed loads go back into the queue after a backoff delay
+    when their failure kind is retryable (see scraper/fetch.py).
+    """
+    if not links:
+        return []
+    queue = fetch.RetryQueue((idx, link, 0) for idx, link in enumerate(links))
+    results: List[Optional[Dict]] = [None] * len(links)
+
+    async def worker(wid: int):
+        ctx = contexts[wid % len(contexts)]
+        page = await ctx.new_page()
         try:
-            el = await page.query_selector(sel)
-            if el:
-                t = (await el.inner_text()).strip()
-                if t and t != price_txt:
-                    orig_txt = t
-                    break
-        except:
-            pass
-    original = _price_to_float(orig_txt)
-    discount = round(100 * (original - price) / original, 2) if (price is not None and original and original > 0) else None
-
-    rating = None
+            while (item := await queue.get()) is not None:
+                idx, link, attempt = item
+                domain = telemetry.domain_of(link)
+                try:
+                    await fetch.breaker.wait(domain)
+                    async with stage("rate_wait", domain):
+                        await limiter.wait(link)
+                    print(f"[PDP {idx + 1}/{len(links)} w{wid}] {link}")
+                    doc = await _scrape_pdp(page, link, query, country)
+                    fetch.breaker.record(domain)
+                except Exception as e:
+                    err = fetch.classify(e, link)
+                    fetch.note_failure(err, domain)
+                    if page.is_closed():
+                        page = await ctx.new_page()
+                    if err.retryable and attempt < fetch.RETRIES:
+                        delay = fetch.backoff(attempt + 1)
+                        fetch.RETRIES_TOTAL.inc(kind=err.kind, domain=domain)
+                        print(f"↻ PDP {err.kind}, retry {attempt + 1}/{fetch.RETRIES} in {delay:.1f}s: {link}")
+                        queue.retry((idx, link, attempt + 1), delay)
+                    else:
+                        print(f"PDP failed ({err.kind}): {link}")
+                        queue.done()
+                    continue
+                try:
+                    if sink:
+                        await sink(doc)
+                    else:
+                        results[idx] = doc
+                except Exception as e:
+                    print("PDP error:", e)
+                finally:
+                    queue.done()
+        finally:
+            await page.close()
+
+    n = max(1, min(concurrency, len(links)))
+    await asyncio.gather(*(worker(i) for i in range(n)))
+    return [r for r in results if r]
+
+CTX_OPTS = dict(
+    user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"),
+    viewport={"width": 1440, "height": 900},
+)
+
+async def launch_browser(p, endpoint: str = BROWSER_ENDPOINT):
+    """Launch a browser, or attach to a running one (see scraper/browser_server.py)."""
+    if endpoint.startswith("http"):
+        print(f"🔌 Attaching to {endpoint}")
+        return await p.chromium.connect_over_cdp(endpoint, slow_mo=SLOW_MO)
+    if endpoint:
+        print(f"🔌 Attaching to {endpoint}")
+        return await getattr(p, BROWSER).connect(endpoint, slow_mo=SLOW_MO)
+    if BROWSER == "chromium":
+        return await p.chromium.launch(headless=HEADLESS, slow_mo=SLOW_MO)
+    return await p.firefox.launch(headless=HEADLESS, slow_mo=SLOW_MO)
+
+def session_path(country: str, session_dir: str = SESSION_DIR) -> Optional[str]:
+    return os.path.join(session_dir, f"amazon.{country}.json") if session_dir else None
+
+def _load_session(path: Optional[str]) -> Optional[Dict]:
+    """Saved storage state for a domain, or None when missing, unreadable or too old."""
+    if not path or not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > SESSION_MAX_HOURS * 3600:
+        return None
     try:
-        el = await page.query_selector("span[data-hook='rating-out-of-text'], span#acrPopover span.a-icon-alt")
-        if el:
-            txt = (await el.inner_text()).strip()
-            if "sur 5" in txt:
-                rating = float(txt.split()[0].replace(",", "."))
-            elif "out of" in txt:
-                rating = float(txt.split(" out of")[0])
-    except:
-        pass
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    reviews = None
+@dataclass
+class Site:
+    """One Amazon country domain opened in a browser context (consent and locale set)."""
+    country: str
+    ctx: object
+    ctx_opts: Dict
+    blocker: Optional[ResourceBlocker] = None
+    session_path: Optional[str] = None
+
+async def open_site(browser, country: str = COUNTRY, block: bool = BLOCK_RESOURCES,
+                    session_dir: str = SESSION_DIR) -> Site:
+    """New context for `country`, consented and localised.
+
+    A saved session (cookies + localStorage from an earlier run) is reused as is; otherwise
+    the home page is visited once for the cookie banner, locale cookies are set and the
+    resulting state is saved for the next run.
+    """
+    locale, lc_main, currency = LOCALES.get(country, ("en-US", "en_US", "EUR"))
+    ctx_opts = dict(CTX_OPTS, locale=locale)
+    path = session_path(country, session_dir)
+    state = _load_session(path)
+    ctx = await browser.new_context(**ctx_opts, storage_state=state)
+    telemetry.attach(ctx)
+    blocker = ResourceBlocker.from_env() if block else None
+    if blocker:
+        await blocker.attach(ctx)
+    site = Site(country, ctx, ctx_opts, blocker, path)
+    if state:
+        cookie_gate(ctx, settled=True)
+        print(f"♻️ [{country}] Reusing saved session {path}")
+        return site
+    page = await ctx.new_page()
+    await page.goto(base_url(country), wait_until="domcontentloaded", timeout=60000)
+    await _accept_cookies(page)
+    await page.close()
     try:
-        el = await page.query_selector("#acrCustomerReviewText, #acrCustomerReviewText .a-size-base")
-        if el:
-            t = (await el.inner_text()).strip().split()[0]
-            t = t.replace(" ", "").replace(",", "").replace(".", "")
-            if t.isdigit():
-                reviews = int(t)
+        await ctx.add_cookies([
+            {"name": "i18n-prefs", "value": currency, "domain": f".amazon.{country}", "path": "/"},
+            {"name": "lc-main", "value": lc_main, "domain": f".amazon.{country}", "path": "/"},
+        ])
     except:
         pass
+    await save_session(site)
+    return site
+
+async def save_session(site: Site):
+    """Write the context's cookies/localStorage to its session file (atomically)."""
+    if not site.session_path:
+        return
+    state = await site.ctx.storage_state()
+    os.makedirs(os.path.dirname(site.session_path) or ".", exist_ok=True)
+    tmp = f"{site.session_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, site.session_path)
+
+async def _search_page(collect, page, query: str, page_no: int, country: str, *args) -> List:
+    """One search page through the fetch layer: retried with backoff; raises FetchError once it gives up."""
+    url = search_url(query, page_no, country)
+    return await fetch.retrying(lambda: collect(page, query, page_no, country, *args),
+                                url, telemetry.domain_of(url))
+
+async def crawl(browser, site: Site, query: str, pages: int = 1, concurrency: int = CONCURRENCY,
+                contexts: int = CONTEXTS, limiter: Optional[_HostRateLimiter] = None,
+                mode: str = MODE, sink: Optional[Sink] = None,
+                fresh_hours: float = FRESH_HOURS) -> List[Dict]:
+    """Scrape `pages` search pages for `query` on an opened site and return the documents.
+
+    Several crawls may share one Site concurrently (each uses its own pages). With a `sink`,
+    documents are streamed to it as they are parsed and the returned list is empty. With
+    `fresh_hours`, PDPs stored more recently than that are skipped (see scraper/freshness.py).
+    A failed search page is skipped; raises FetchError when every one of them failed.
+    """
+    country, ctx = site.country, site.ctx
+    limiter = limiter or _HostRateLimiter(HOST_RPS)
+    page = await ctx.new_page()
+    links: List[str] = []
+    prices: Dict[str, Optional[float]] = {}
+    card_docs: List[Dict] = []
+    extras = []
+    failed: List[FetchError] = []
 
-    image = None
-    for sel in ["#imgTagWrapperId img", "#landingImage", "img#landingImage"]:
-        try:
-            el = await page.query_selector(sel)
-            if el:
-                image = await el.get_attribute("src")
-                if image:
-                    break
-        except:
-            pass
-
-    return price, original, discount, rating, reviews, image
-
-async def scrape_search_to_pdp(query: str, pages: int = 1) -> List[Dict]:
-    out: List[Dict] = []
-    async with async_playwright() as p:
-        if BROWSER == "chromium":
-            browser = await p.chromium.launch(headless=HEADLESS, slow_mo=SLOW_MO)
-        else:
-            browser = await p.firefox.launch(headless=HEADLESS, slow_mo=SLOW_MO)
-
-        ctx = await browser.new_context(
-            user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                        "AppleWebKit/537.36 (KHTML, like Gecko) "
-                        "Chrome/120.0.0.0 Safari/537.36"),
-            viewport={"width": 1440, "height": 900},
-            locale="fr-FR" if COUNTRY == "fr" else "en-US",
-        )
-        page = await ctx.new_page()
-
-        await page.goto(BASE, wait_until="domcontentloaded", timeout=60000)
-        await _accept_cookies(page)
+    async def search(collect, pno: int, *args) -> List:
         try:
-            await ctx.add_cookies([
-                {"name": "i18n-prefs", "value": "EUR", "domain": f".amazon.{COUNTRY}", "path": "/"},
-                {"name": "lc-main", "value": "fr_FR" if COUNTRY == "fr" else "en_US",
-                 "domain": f".amazon.{COUNTRY}", "path": "/"},
-            ])
-        except:
-            pass
-
-        links: List[str] = []
-        for pno in range(1, pages + 1):
-            more = await _collect_search_links(page, query, pno)
-            links.extend(more)
-        print(f"Total PDP links collected: {len(links)}")
-
-        for idx, link in enumerate(links, 1):
-            try:
-                print(f"[PDP {idx}/{len(links)}] {link}")
-                await page.goto(link, wait_until="domcontentloaded", timeout=60000)
-                await _accept_cookies(page)
-                await page.wait_for_timeout(800)
-
-                title = None
-                try:
-                    te = await page.query_selector("#productTitle")
-                    if te:
-                        title = (await te.inner_text()).strip()
-                except:
-                    pass
-
-                price, original, discount, rating, reviews, image = await _parse_pdp(page)
-
-                if title and (price is not None):
-                    out.append({
-                        "category": query,
-                        "title": title,
-                        "brand": None,
-                        "price": price,
-                        "original_price": original,
-                        "discount_pct": discount,
-                        "rating": rating,
-                        "reviews": reviews,
-                        "product_link": link,
-                        "image": image,
-                        "availability": None,
-                        "source": f"amazon.{COUNTRY}",
-                    })
-            except Exception as e:
-                print("PDP error:", e)
+            return await _search_page(collect, page, query, pno, country, *args)
+        except FetchError as e:
+            failed.append(e)
+            print(f"Search page {pno} failed ({e.kind}), skipping it")
+            return []
 
+    try:
+        if mode == "cards":
+            seen, complete = set(), 0
+            for pno in range(1, pages + 1):
+                for card in await search(_collect_search_cards, pno):
+                    if card["asin"] in seen:
+                        continue
+                    seen.add(card["asin"])
+                    if all(card.get(k) is not None for k in REQUIRED_FIELDS):
+                        complete += 1
+                        telemetry.product("ok", telemetry.domain_of(base_url(country)), asin=card["asin"], via="card")
+                        if sink:
+                            await sink(_card_to_doc(card, query, country))
+                        else:
+                            card_docs.append(_card_to_doc(card, query, country))
+                    elif card["product_link"]:
+                        links.append(card["product_link"])
+                        prices[card["asin"]] = card["price"]
+            print(f"Cards complete: {complete}, PDP fallbacks: {len(links)}")
+        else:
+            for pno in range(1, pages + 1):
+                more = await search(_collect_search_links, pno, prices if fresh_hours > 0 else None)
+                links.extend(more)
+            print(f"Total PDP links collected: {len(links)}")
+        if pages > 0 and len(failed) == pages:
+            # Every page blocked (captcha, 503...): an error, not an empty result, so the
+            # scheduler records the job as failed and retries it after RETRY_MINUTES.
+            raise FetchError(failed[-1].kind, search_url(query, 1, country),
+                             f"all {pages} search pages failed")
+
+        if fresh_hours > 0 and links:
+            found = len(links)
+            async with stage("freshness", "mongo", links=found):
+                links, reasons = await select_stale(links, prices, f"amazon.{country}", fresh_hours)
+            if reasons["fresh"]:
+                telemetry.PRODUCTS_TOTAL.inc(reasons["fresh"], outcome="fresh",
+                                             domain=telemetry.domain_of(base_url(country)))
+            print(f"♻️ Skipping {reasons['fresh']} fresh PDPs of {found} "
+                  f"(visiting: new={reasons['new']} expired={reasons['expired']} price={reasons['price']})")
+
+        # Extra contexts start from the first one's cookies (consent + locale).
+        ctxs = [ctx]
+        if contexts > 1 and links:
+            state = await ctx.storage_state()
+            for _ in range(min(contexts, concurrency) - 1):
+                extra = await browser.new_context(**site.ctx_opts, storage_state=state)
+                cookie_gate(extra, settled=True)
+                telemetry.attach(extra)
+                if site.blocker:
+                    await site.blocker.attach(extra)
+                extras.append(extra)
+            ctxs += extras
+
+        return card_docs + await _pdp_pool(ctxs, links, query, concurrency, limiter, sink, country)
+    finally:
+        await page.close()
+        for extra in extras:
+            await extra.close()
+
+def print_site_summary(site: Site):
+    if site.blocker:
+        b = site.blocker.summary()
+        print(f"🚫 [{site.country}] Blocked {b['requests_blocked']} requests {b['blocked_by_type']}, "
+              f"~{b['bytes_avoided_est'] / 1e6:.1f} MB avoided, "
+              f"{b['bytes_downloaded'] / 1e6:.1f} MB downloaded")
+
+async def scrape_search_to_pdp(query: str, pages: int = 1, concurrency: int = CONCURRENCY,
+                               contexts: int = CONTEXTS, host_rps: float = HOST_RPS,
+                               mode: str = MODE, block: bool = BLOCK_RESOURCES,
+                               sink: Optional[Sink] = None, country: str = COUNTRY,
+                               fresh_hours: float = FRESH_HOURS, session_dir: str = SESSION_DIR,
+                               endpoint: str = BROWSER_ENDPOINT) -> List[Dict]:
+    """Scrape `pages` search pages for `query` and return the product documents.
+
+    With a `sink` coroutine, documents are streamed to it as they are parsed and the
+    returned list is empty.
+    """
+    async with async_playwright() as p:
+        browser = await launch_browser(p, endpoint)
+        site = await open_site(browser, country, block, session_dir)
+        out = await crawl(browser, site, query, pages, concurrency, contexts,
+                          _HostRateLimiter(host_rps), mode, sink, fresh_hours)
+        await save_session(site)   # keep cookies the site refreshed during the run
+        print_site_summary(site)
+        print(f"⏱️ Adaptive waits saved ~{wait_stats.saved_ms() / 1000:.1f}s: {wait_stats.summary()}")
         await browser.close()
     return out
 
+_indexes_ready = False
+
 async def save_many(docs: List[Dict]) -> int:
     if not docs:
         return 0
+    global _indexes_ready
     col = get_collection()
+    if not _indexes_ready:
+        await ensure_all_indexes()
+        _indexes_ready = True
+    # History first: it diffs against the values the upsert is about to overwrite.
+    await record_changes(docs, products=col)
     ops = []
     for d in docs:
-        key = {"title": d.get("title"), "source": d.get("source")}
+        # (source, asin) is the identity; title is only a fallback for docs without an ASIN.
+        if d.get("asin"):
+            key = {"source": d.get("source"), "asin": d["asin"]}
+        else:
+            key = {"title": d.get("title"), "source": d.get("source")}
         ops.append(UpdateOne(key, {"$set": d}, upsert=True))
-    res = await col.bulk_write(ops, ordered=False)
-    return (res.upserted_count or 0) + (res.modified_count or 0)
-
-async def main_async(query: str, pages: int):
-    docs = await scrape_search_to_pdp(query, pages)
-    print(f"Scraped {len(docs)} items. Saving...")
-    changed = await save_many(docs)
-    print(f"Upserted/updated: {changed} documents.")
+    async with stage("save", "mongo", docs=len(docs)):
+        res = await col.bulk_write(ops, ordered=False)
+        # Freshness stamp for incremental recrawls; a separate write so modified_count above
+        # still only counts products whose data changed.
+        now = datetime.now(timezone.utc)
+        by_source: Dict[Optional[str], List[str]] = {}
+        for d in docs:
+            if d.get("asin"):
+                by_source.setdefault(d.get("source"), []).append(d["asin"])
+        for source, asins in by_source.items():
+            await col.update_many({"source": source, "asin": {"$in": asins}},
+                                  {"$set": {"last_scraped_at": now}})
+    changed = (res.upserted_count or 0) + (res.modified_count or 0)
+    if changed:
+        async with stage("leaderboard", "mongo"):
+            await apply_batch(docs)  # keep the /best-deals leaderboards current
+        await bump_version()         # invalidates the API response cache
+    return changed
+
+async def main_async(query: str, pages: int, concurrency: int = CONCURRENCY,
+                     contexts: int = CONTEXTS, host_rps: float = HOST_RPS, mode: str = MODE,
+                     block: bool = BLOCK_RESOURCES, batch_size: int = BATCH_SIZE,
+                     flush_secs: float = FLUSH_SECS, metrics_file: str = telemetry.METRICS_FILE,
+                     country: str = COUNTRY, fresh_hours: float = FRESH_HOURS,
+                     session_dir: str = SESSION_DIR, endpoint: str = BROWSER_ENDPOINT):
+    # Products are written in batches while the crawl runs (see scraper/pipeline.py).
+    t0 = time.perf_counter()
+    writer = BatchWriter(save_many, batch_size=batch_size, flush_secs=flush_secs).start()
+    try:
+        await scrape_search_to_pdp(query, pages, concurrency=concurrency, contexts=contexts,
+                                   host_rps=host_rps, mode=mode, block=block, sink=writer.put,
+                                   country=country, fresh_hours=fresh_hours,
+                                   session_dir=session_dir, endpoint=endpoint)
+    finally:
+        stats = await writer.close()
+        telemetry.log.emit("run", query=query, pages=pages, mode=mode, received=stats.received,
+                           changed=stats.changed, failed_batches=stats.failed_batches,
+                           seconds=round(time.perf_counter() - t0, 2))
+        telemetry.write_metrics(metrics_file)
+        await archive.close()
+    print(f"Scraped {stats.received} items in {stats.batches} batches.")
+    print(f"Upserted/updated: {stats.changed} documents.")
+    if stats.fallback_files:
+        print(f"⚠️ {stats.failed_batches} batches saved to JSON instead: {', '.join(stats.fallback_files)}")
+    telemetry.print_summary(time.perf_counter() - t0)
+    fetch.print_summary()
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("query")
     parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--country", default=COUNTRY, help="Amazon domain suffix: fr, de, it, co.uk, com...")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="PDP pages fetched in parallel")
+    parser.add_argument("--contexts", type=int, default=CONTEXTS, help="browser contexts shared by the PDP workers")
+    parser.add_argument("--rps", type=float, default=HOST_RPS, help="max PDP navigations per second per host (0 = no limit)")
+    parser.add_argument("--mode", choices=["pdp", "cards"], default=MODE,
+                        help="cards: build documents from the search grid, visit PDPs only for incomplete cards")
+    parser.add_argument("--block", action=argparse.BooleanOptionalAction, default=BLOCK_RESOURCES,
+                        help="abort images/fonts/media and ad/tracker requests (SCRAPER_BLOCK_* to tune)")
+    parser.add_argument("--fresh-hours", type=float, default=FRESH_HOURS,
+                        help="skip PDPs scraped less than this many hours ago unless the card price changed (0 = visit all)")
+    parser.add_argument("--session-dir", default=SESSION_DIR,
+                        help="where per-domain cookies/localStorage are saved and reused ('' = always start fresh)")
+    parser.add_argument("--connect", default=BROWSER_ENDPOINT,
+                        help="attach to a running browser instead of launching one (see scraper/browser_server.py)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="documents per Mongo write")
+    parser.add_argument("--flush-secs", type=float, default=FLUSH_SECS, help="max seconds a parsed product waits before being written")
+    parser.add_argument("--metrics-file", default=telemetry.METRICS_FILE,
+                        help="Prometheus textfile written at the end of the run ('' to skip)")
+    parser.add_argument("--log-json", default=telemetry.LOG_JSON,
+                        help="JSON-lines log of every timed stage: a path, or - for stderr")
+    parser.add_argument("--archive", default=archive.ARCHIVE_DIR,
+                        help="store every fetched page compressed under this directory (see scraper/archive.py)")
     args = parser.parse_args()
-    asyncio.run(main_async(args.query, args.pages))
+    telemetry.set_log(args.log_json)
+    archive.set_archive(args.archive)
+    asyncio.run(main_async(args.query, args.pages, args.concurrency, args.contexts, args.rps,
+                           args.mode, args.block, args.batch_size, args.flush_secs, args.metrics_file,
+                           args.country, args.fresh_hours, args.session_dir, args.connect))
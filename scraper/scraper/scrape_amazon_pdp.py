@@ -1,11 +1,11 @@
-﻿import os, asyncio
+﻿import os, asyncio, json
 import time
 from typing import List, Dict, Optional, Tuple
 from urllib.parse import quote_plus, urljoin
 from dotenv import load_dotenv
-from pymongo import UpdateOne
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
-from common.db import get_collection
+from common.asin import asin_from_url, canonical_link
+from scraper.scrape_amazon_playwright import save_many as _save_products
 
 load_dotenv()
 
@@ -236,7 +236,9 @@ async def scrape_search_to_pdp(query: str, pages: int = 1) -> List[Dict]:
                 price, original, discount, rating, reviews, image = await _parse_pdp(page)
 
                 if title and (price is not None):
+                    asin = asin_from_url(page.url) or asin_from_url(link)
                     out.append({
+                        "asin": asin,
                         "category": query,
                         "title": title,
                         "brand": None,
@@ -245,7 +247,7 @@ async def scrape_search_to_pdp(query: str, pages: int = 1) -> List[Dict]:
                         "discount_pct": discount,
                         "rating": rating,
                         "reviews": reviews,
-                        "product_link": link,
+                        "product_link": canonical_link(BASE, asin) if asin else link,
                         "image": image,
                         "availability": None,
                         "source": f"amazon.{COUNTRY}",
@@ -257,22 +259,12 @@ async def scrape_search_to_pdp(query: str, pages: int = 1) -> List[Dict]:
     return out
 
 async def save_many(docs):
-    """Upsert docs without blocking the event loop."""
+    """Upsert docs through the main scraper's save path: (source, asin) keys, price
+    history, leaderboards and API cache invalidation."""
     if not docs:
         return 0
-    col = get_collection()
-    ops = []
-    for d in docs:
-        key = {"title": d.get("title"), "source": d.get("source")}
-        ops.append(UpdateOne(key, {"$set": d}, upsert=True))
-
-    def _write():
-        # synchronous call executed in a worker thread
-        return col.bulk_write(ops, ordered=False)
-
     try:
-        res = await asyncio.to_thread(_write)
-        return (res.upserted_count or 0) + (res.modified_count or 0)
+        return await _save_products(docs)
     except Exception as e:
         # Optional safety net: save to JSON so you don't lose the scrape
         os.makedirs("data/out", exist_ok=True)
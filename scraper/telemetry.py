@@ -0,0 +1,100 @@
+# scraper/telemetry.py
+# Per-stage timing for scraper runs: every navigation, cookie check, scroll, wait, parse and
+# Mongo write is timed into a histogram labelled by stage and domain, with ok/error counters
+# and downloaded bytes next to it. The registry is written as a Prometheus textfile at the
+# end of a run (SCRAPER_METRICS_FILE), each observation can also go to a JSON-lines log
+# (SCRAPER_LOG_JSON: a path, or "-" for stderr), and `print_summary()` prints the run table.
+
+import os, time
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urlparse
+from common.metrics import Registry, JsonLog, bucket_quantile
+
+METRICS_FILE = os.getenv("SCRAPER_METRICS_FILE", os.path.join("data", "metrics", "scraper.prom"))
+LOG_JSON     = os.getenv("SCRAPER_LOG_JSON", "")
+
+registry = Registry()
+STAGE_SECONDS = registry.histogram("scraper_stage_seconds", "Time spent per scraper stage.")
+STAGE_TOTAL   = registry.counter("scraper_stage_total", "Scraper stage executions by outcome.")
+BYTES_TOTAL   = registry.counter("scraper_bytes_downloaded_total",
+                                 "Response bytes received (Content-Length), by domain and resource type.")
+PRODUCTS_TOTAL = registry.counter("scraper_products_total", "Products parsed, by outcome.")
+
+log = JsonLog(LOG_JSON)
+
+def set_log(target: Optional[str]):
+    """Redirect the JSON event log (path, "-" for stderr, empty to disable)."""
+    global log
+    log.close()
+    log = JsonLog(target)
+
+def domain_of(url: Optional[str]) -> str:
+    return (urlparse(url).netloc if url else "") or "-"
+
+@asynccontextmanager
+async def stage(name: str, domain: str = "-", **fields):
+    """Time the enclosed block as one `name` stage; exceptions are counted and re-raised."""
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        secs = time.perf_counter() - t0
+        STAGE_SECONDS.observe(secs, stage=name, domain=domain)
+        STAGE_TOTAL.inc(stage=name, domain=domain, outcome=outcome)
+        log.emit("stage", stage=name, domain=domain, ms=round(secs * 1000, 1), outcome=outcome, **fields)
+
+def product(outcome: str, domain: str, **fields):
+    PRODUCTS_TOTAL.inc(outcome=outcome, domain=domain)
+    log.emit("product", outcome=outcome, domain=domain, **fields)
+
+def attach(ctx):
+    """Count downloaded bytes for every response of a browser context."""
+    def on_response(response):
+        try:
+            size = int(response.headers.get("content-length", ""))
+        except ValueError:
+            return
+        BYTES_TOTAL.inc(size, domain=domain_of(response.url), type=response.request.resource_type)
+    ctx.on("response", on_response)
+
+def summary() -> dict:
+    """{stage: {count, errors, total_s, p50_ms, p95_ms}}, all domains merged."""
+    merged = {}
+    for labels, series in STAGE_SECONDS.series.items():
+        d = dict(labels)
+        acc = merged.setdefault(d["stage"], [0] * len(series))
+        for i, v in enumerate(series):
+            acc[i] += v
+    out = {}
+    for name, series in merged.items():
+        counts = series[:-1]
+        errors = sum(v for k, v in STAGE_TOTAL.values.items()
+                     if dict(k)["stage"] == name and dict(k)["outcome"] == "error")
+        out[name] = {
+            "count": sum(counts),
+            "errors": int(errors),
+            "total_s": series[-1],
+            "p50_ms": (bucket_quantile(0.5, STAGE_SECONDS.buckets, counts) or 0) * 1000,
+            "p95_ms": (bucket_quantile(0.95, STAGE_SECONDS.buckets, counts) or 0) * 1000,
+        }
+    return out
+
+def print_summary(wall_s: float):
+    rows = sorted(summary().items(), key=lambda kv: -kv[1]["total_s"])
+    print(f"⏱️ Run took {wall_s:.1f}s. Time per stage (summed over workers):")
+    print(f"   {'stage':<14}{'count':>7}{'errors':>8}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, s in rows:
+        print(f"   {name:<14}{s['count']:>7}{s['errors']:>8}{s['total_s']:>10.1f}"
+              f"{s['p50_ms']:>9.0f}{s['p95_ms']:>9.0f}")
+    ok, incomplete, fresh = (sum(v for k, v in PRODUCTS_TOTAL.values.items() if dict(k)["outcome"] == o)
+                             for o in ("ok", "incomplete", "fresh"))
+    mb = sum(BYTES_TOTAL.values.values()) / 1e6
+    print(f"   products ok={ok:g} incomplete={incomplete:g} skipped fresh={fresh:g}, downloaded {mb:.1f} MB")
+
+def write_metrics(path: str = METRICS_FILE):
+    if path:
+        registry.write(path)
+        print(f"📈 Metrics written to {path}")
@@ -0,0 +1,129 @@
+# scraper/waits.py
+# Condition-driven waits that replace the scraper's fixed sleeps:
+#   - scroll the search grid only until the result count stops growing,
+#   - look for the cookie banner once per browser context, then never again,
+#   - wait for the PDP title/price nodes instead of a blind 800 ms.
+# Every wait records how long the old fixed delay would have cost, so a run can
+# report the time saved. Cookie probes skipped on settled contexts are only counted,
+# not credited, since the old per-selector probe cost varied.
+
+import re, time, asyncio, weakref
+from typing import Dict
+from playwright.async_api import TimeoutError as PWTimeout
+
+RESULT_SELECTOR = "div.s-result-item[data-component-type='s-search-result']"
+PDP_READY_SELECTOR = ("#productTitle, #corePrice_desktop, #corePrice_feature_div, "
+                      "#price_inside_buybox, span.a-price")
+
+# What the fixed-delay version spent on each step (ms).
+LEGACY_SCROLL_MS = 18 * 350
+LEGACY_PDP_SETTLE_MS = 800
+LEGACY_COOKIE_SETTLE_MS = 800
+
+class WaitStats:
+    """Accumulates actual wait time vs the legacy fixed delays, per kind of wait."""
+
+    def __init__(self):
+        self.actual_ms: Dict[str, float] = {}
+        self.legacy_ms: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def add(self, kind: str, actual_ms: float, legacy_ms: float):
+        self.actual_ms[kind] = self.actual_ms.get(kind, 0.0) + actual_ms
+        self.legacy_ms[kind] = self.legacy_ms.get(kind, 0.0) + legacy_ms
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def saved_ms(self) -> float:
+        return sum(self.legacy_ms.values()) - sum(self.actual_ms.values())
+
+    def summary(self) -> Dict:
+        return {
+            kind: {"calls": self.calls[kind],
+                   "waited_s": round(self.actual_ms[kind] / 1000, 2),
+                   "saved_s": round((self.legacy_ms[kind] - self.actual_ms[kind]) / 1000, 2)}
+            for kind in self.calls
+        }
+
+wait_stats = WaitStats()
+
+async def scroll_until_stable(page, selector: str = RESULT_SELECTOR, max_steps: int = 18,
+                              dy: int = 1600, grow_timeout_ms: int = 350, stable_rounds: int = 2):
+    """Wheel down until the number of `selector` matches stops growing or the page bottom is reached."""
+    t0 = time.perf_counter()
+    count = await page.locator(selector).count()
+    stable = 0
+    for _ in range(max_steps):
+        await page.mouse.wheel(0, dy)
+        try:
+            await page.wait_for_function(
+                "([sel, n]) => document.querySelectorAll(sel).length > n",
+                arg=[selector, count], timeout=grow_timeout_ms,
+            )
+            count = await page.locator(selector).count()
+            stable = 0
+        except PWTimeout:
+            stable += 1
+        at_bottom = await page.evaluate(
+            "() => window.innerHeight + window.scrollY >= document.body.scrollHeight - 2"
+        )
+        if at_bottom or stable >= stable_rounds:
+            break
+    wait_stats.add("scroll", (time.perf_counter() - t0) * 1000, LEGACY_SCROLL_MS)
+    return count
+
+async def wait_pdp_ready(page, timeout_ms: int = 5000):
+    """Wait until the title or a price node is in the DOM (instead of a fixed 800 ms)."""
+    t0 = time.perf_counter()
+    try:
+        await page.wait_for_selector(PDP_READY_SELECTOR, state="attached", timeout=timeout_ms)
+    except PWTimeout:
+        pass
+    wait_stats.add("pdp_ready", (time.perf_counter() - t0) * 1000, LEGACY_PDP_SETTLE_MS)
+
+_ACCEPT_CSS = "#sp-cc-accept, input#sp-cc-accept, button[name='accept']"
+_ACCEPT_TEXT = re.compile(r"^(Accepter( les cookies)?|Tout accepter|J[’']accepte|Allow all cookies|Accept( all)?( cookies)?)$", re.I)
+
+class CookieGate:
+    """Accepts the consent banner at most once per browser context.
+
+    The first page to call `accept` probes for the banner (one combined locator, bounded
+    wait); whatever the outcome, the context is then marked settled and later calls return
+    immediately. Contexts cloned from an already-consented storage state start settled.
+    """
+
+    def __init__(self, settled: bool = False):
+        self.settled = settled
+        self._lock = asyncio.Lock()
+
+    async def accept(self, page, timeout_ms: int = 1500):
+        if self.settled:
+            wait_stats.add("cookies_skipped", 0, 0)
+            return
+        async with self._lock:
+            if self.settled:
+                return
+            t0 = time.perf_counter()
+            legacy_ms = 0
+            banner = page.locator(_ACCEPT_CSS).or_(page.get_by_role("button", name=_ACCEPT_TEXT)).first
+            try:
+                await banner.wait_for(state="visible", timeout=timeout_ms)
+                await banner.click()
+                try:
+                    await banner.wait_for(state="hidden", timeout=2000)
+                except PWTimeout:
+                    pass
+                legacy_ms = LEGACY_COOKIE_SETTLE_MS
+                print("✅ Cookies accepted")
+            except PWTimeout:
+                print("ℹ️ No cookie banner detected or already accepted.")
+            self.settled = True
+            wait_stats.add("cookies", (time.perf_counter() - t0) * 1000, legacy_ms)
+
+_gates: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def cookie_gate(ctx, settled: bool = False) -> CookieGate:
+    """The CookieGate for a browser context (created on first use)."""
+    gate = _gates.get(ctx)
+    if gate is None:
+        gate = _gates[ctx] = CookieGate(settled)
+    return gate
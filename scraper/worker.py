@@ -0,0 +1,238 @@
+# scraper/worker.py
+# Distributed crawl: start any number of workers (one browser each, on one or several
+# machines, all pointed at the same MONGO_URI) and feed them search jobs. A search job
+# loads one results page and enqueues a PDP job per product (deduplicated by ASIN, see
+# scraper/jobqueue.py); a PDP job loads the product and writes it through the usual batched
+# save path. PDP jobs are only marked done once their product is in Mongo.
+#
+#   python -m scraper.worker enqueue "ssd 1to" --domain fr --pages 5
+#   python -m scraper.worker run --slots 4                 # in as many shells / hosts as wanted
+#   python -m scraper.worker run --exit-when-idle 30       # stop after 30s without work
+#   python -m scraper.worker status
+
+import os, time, asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional
+from playwright.async_api import async_playwright
+from scraper import archive, fetch, jobqueue, telemetry
+from scraper.freshness import FRESH_HOURS, select_stale
+from scraper.pipeline import BatchWriter, BATCH_SIZE, FLUSH_SECS
+from scraper.scrape_amazon_playwright import (COUNTRY, BLOCK_RESOURCES, BROWSER_ENDPOINT, HOST_RPS,
+                                              REQUIRED_FIELDS, SESSION_DIR, _HostRateLimiter,
+                                              _card_to_doc, _collect_search_cards, _scrape_pdp,
+                                              launch_browser, open_site, print_site_summary,
+                                              save_many, save_session, search_url)
+from scraper.extract import asin_from_url
+from scraper.scheduler import _domain
+
+SLOTS     = int(os.getenv("SCRAPER_WORKER_SLOTS", "4"))         # jobs in progress per worker
+POLL_SECS = float(os.getenv("SCRAPER_WORKER_POLL_SECS", "2"))   # wait when the queue is empty
+
+class Worker:
+    def __init__(self, slots: int = SLOTS, kinds: Optional[List[str]] = None, domain: Optional[str] = None,
+                 host_rps: float = HOST_RPS, block: bool = BLOCK_RESOURCES, session_dir: str = SESSION_DIR,
+                 endpoint: str = BROWSER_ENDPOINT, batch_size: int = BATCH_SIZE, flush_secs: float = FLUSH_SECS):
+        self.id = jobqueue.worker_id()
+        self.slots, self.kinds, self.domain = max(1, slots), kinds, domain
+        self.block, self.session_dir, self.endpoint = block, session_dir, endpoint
+        self.limiter = _HostRateLimiter(host_rps)
+        self.writer = BatchWriter(self._save, batch_size=batch_size, flush_secs=flush_secs)
+        self.sites: Dict[str, object] = {}
+        self._site_locks = defaultdict(asyncio.Lock)
+        self.in_flight: Dict[str, Dict] = {}   # job id -> job, leased by this process and not finished
+        self.done = defaultdict(int)
+        self.last_work = time.monotonic()
+
+    async def _save(self, batch: List[Dict]) -> int:
+        # Each product carries the id of the PDP job that produced it; the job is completed
+        # only after the write went through. A failed batch (BatchWriter dumps it to JSON)
+        # re-queues its jobs with backoff and stops extending their leases.
+        ids = [i for i in (d.pop("_job_id", None) for d in batch) if i]
+        try:
+            changed = await save_many(batch)
+        except Exception as e:
+            jobs = [self.in_flight.pop(i) for i in ids if i in self.in_flight]
+            for job in jobs:
+                try:
+                    await jobqueue.fail(job, self.id, f"save failed: {e.__class__.__name__}: {e}",
+                                        fetch.backoff(job["attempts"]))
+                except Exception:
+                    pass   # Mongo unreachable: the lease expires and the job is handed out again
+            self.done["pdp_save_failed"] += len(jobs)
+            raise
+        await jobqueue.complete(ids, self.id)
+        for i in ids:
+            self.in_flight.pop(i, None)
+        return changed
+
+    async def _site(self, browser, domain: str):
+        async with self._site_locks[domain]:
+            if domain not in self.sites:
+                self.sites[domain] = await open_site(browser, domain, self.block, self.session_dir)
+            return self.sites[domain]
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(jobqueue.VISIBILITY_SECS / 3)
+            for job_id in list(self.in_flight):
+                if not await jobqueue.extend(job_id, self.id):
+                    print(f"⚠️ Lost the lease on {job_id}")
+
+    async def _search(self, page, job: Dict) -> Dict:
+        country, query = job["domain"], job["query"]
+        prices: Dict[str, Optional[float]] = {}
+        links, pdp_jobs = [], []
+        for card in await _collect_search_cards(page, query, job["page"], country):
+            if job.get("mode") == "cards" and all(card.get(k) is not None for k in REQUIRED_FIELDS):
+                await self.writer.put(_card_to_doc(card, query, country))
+            elif card["product_link"]:
+                links.append(card["product_link"])
+                prices[card["asin"]] = card["price"]
+        found = len(links)
+        if job.get("fresh_hours"):
+            links, _ = await select_stale(links, prices, f"amazon.{country}", job["fresh_hours"])
+        for link in links:
+            asin = asin_from_url(link)
+            if asin:
+                pdp_jobs.append(jobqueue.pdp_job(link, asin, country, query, job.get("priority", 0) + 1))
+        queued = await jobqueue.enqueue(pdp_jobs)
+        print(f"🔎 [{job['_id']}] {found} products, {queued} PDP jobs queued "
+              f"({len(pdp_jobs) - queued} already queued or recently done)")
+        return {"products": found, "queued": queued}
+
+    async def _run_job(self, browser, pages: Dict, job: Dict):
+        domain = telemetry.domain_of(f"https://www.amazon.{job['domain']}")
+        url = job.get("url") or search_url(job["query"], job["page"], job["domain"])
+        try:
+            site = await self._site(browser, job["domain"])
+            page = pages.get(job["domain"])
+            if page is None or page.is_closed():
+                page = pages[job["domain"]] = await site.ctx.new_page()
+            await fetch.breaker.wait(domain)
+            await self.limiter.wait(url)
+            if job["kind"] == "search":
+                result = await self._search(page, job)
+            else:
+                doc = await _scrape_pdp(page, job["url"], job["query"], job["domain"])
+            fetch.breaker.record(domain)
+        except Exception as e:
+            err = fetch.classify(e, url)
+            fetch.note_failure(err, domain)
+            retry_in = fetch.backoff(job["attempts"]) if err.retryable else None
+            if retry_in is not None and job["attempts"] < jobqueue.MAX_ATTEMPTS:
+                fetch.RETRIES_TOTAL.inc(kind=err.kind, domain=domain)
+            await jobqueue.fail(job, self.id, str(err), retry_in)
+            self.in_flight.pop(job["_id"], None)
+            self.done[f"{job['kind']}_failed"] += 1
+            print(f"❌ [{job['_id']}] {err} (attempt {job['attempts']}/{jobqueue.MAX_ATTEMPTS})")
+            return
+        if job["kind"] == "search":
+            await jobqueue.complete([job["_id"]], self.id, result)
+            self.in_flight.pop(job["_id"], None)
+        else:
+            await self.writer.put({**doc, "_job_id": job["_id"]})   # completed by _save
+        self.done[job["kind"]] += 1
+
+    async def _slot(self, browser, stop: asyncio.Event):
+        pages: Dict[str, object] = {}   # one tab per domain for this slot
+        try:
+            while not stop.is_set():
+                job = await jobqueue.lease(self.id, self.kinds, self.domain)
+                if job is None:
+                    await asyncio.sleep(POLL_SECS)
+                    continue
+                self.last_work = time.monotonic()
+                self.in_flight[job["_id"]] = job
+                await self._run_job(browser, pages, job)
+                self.last_work = time.monotonic()
+        finally:
+            for page in pages.values():
+                await page.close()
+
+    async def run(self, exit_when_idle: float = 0):
+        await jobqueue.ensure_indexes()
+        print(f"👷 Worker {self.id}: {self.slots} slots, kinds={self.kinds or 'all'}, domain={self.domain or 'all'}")
+        t0 = time.perf_counter()
+        stop = asyncio.Event()
+        self.writer.start()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            async with async_playwright() as p:
+                browser = await launch_browser(p, self.endpoint)
+                slots = [asyncio.create_task(self._slot(browser, stop)) for _ in range(self.slots)]
+                try:
+                    while not all(s.done() for s in slots):
+                        await asyncio.sleep(POLL_SECS)
+                        await jobqueue.reap()
+                        idle = time.monotonic() - self.last_work
+                        if exit_when_idle and not stop.is_set() and not self.in_flight and idle >= exit_when_idle:
+                            print(f"💤 No work for {idle:.0f}s, stopping")
+                            stop.set()
+                    await asyncio.gather(*slots)
+                finally:
+                    for s in slots:
+                        s.cancel()
+                    await asyncio.gather(*slots, return_exceptions=True)
+                    await self.writer.close()
+                    for site in self.sites.values():
+                        await save_session(site)
+                        print_site_summary(site)
+                    await browser.close()
+        finally:
+            heartbeat.cancel()
+            # Whatever is still leased here was interrupted: hand it back for other workers.
+            await jobqueue.release(list(self.in_flight), self.id)
+            telemetry.write_metrics()
+            await archive.close()
+        print(f"✅ Worker {self.id} done: {dict(self.done)}")
+        telemetry.print_summary(time.perf_counter() - t0)
+        fetch.print_summary()
+
+async def enqueue_search(query: str, domain: str, pages: int, priority: int, mode: str,
+                         fresh_hours: float) -> int:
+    await jobqueue.ensure_indexes()
+    jobs = [jobqueue.search_job(query, domain, n, priority, mode, fresh_hours) for n in range(1, pages + 1)]
+    return await jobqueue.enqueue(jobs, requeue_after_minutes=0)
+
+async def print_status():
+    counts = await jobqueue.counts()
+    statuses = ["queued", "leased", "done", "failed"]
+    print(f"{'kind':<8}" + "".join(f"{s:>9}" for s in statuses))
+    for kind, by_status in sorted(counts.items()):
+        print(f"{kind:<8}" + "".join(f"{by_status.get(s, 0):>9}" for s in statuses))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    e = sub.add_parser("enqueue", help="queue search pages for a query")
+    e.add_argument("query")
+    e.add_argument("--domain", default=COUNTRY)
+    e.add_argument("--pages", type=int, default=1)
+    e.add_argument("--priority", type=int, default=0)
+    e.add_argument("--mode", choices=["pdp", "cards"], default="pdp")
+    e.add_argument("--fresh-hours", type=float, default=FRESH_HOURS)
+    r = sub.add_parser("run", help="lease and crawl jobs until stopped")
+    r.add_argument("--slots", type=int, default=SLOTS, help="jobs in progress at once in this worker")
+    r.add_argument("--kinds", default="", help="only these job kinds, e.g. pdp (default: all)")
+    r.add_argument("--domain", default=None, help="only jobs for this Amazon domain")
+    r.add_argument("--rps", type=float, default=HOST_RPS, help="max navigations per second per host, for this worker")
+    r.add_argument("--block", action=argparse.BooleanOptionalAction, default=BLOCK_RESOURCES)
+    r.add_argument("--session-dir", default=SESSION_DIR)
+    r.add_argument("--connect", default=BROWSER_ENDPOINT)
+    r.add_argument("--archive", default=archive.ARCHIVE_DIR)
+    r.add_argument("--exit-when-idle", type=float, default=0, help="stop after this many seconds without work (0 = never)")
+    sub.add_parser("status", help="job counts by kind and status")
+    args = parser.parse_args()
+    if args.command == "enqueue":
+        n = asyncio.run(enqueue_search(args.query, _domain(args.domain), args.pages, args.priority,
+                                       args.mode, args.fresh_hours))
+        print(f"🗓️ {n} search jobs queued")
+    elif args.command == "status":
+        asyncio.run(print_status())
+    else:
+        archive.set_archive(args.archive)
+        worker = Worker(args.slots, [k for k in args.kinds.split(",") if k] or None,
+                        _domain(args.domain) if args.domain else None, args.rps, args.block,
+                        args.session_dir, args.connect)
+        asyncio.run(worker.run(args.exit_when_idle))
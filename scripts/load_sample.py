@@ -1,14 +1,180 @@
-import json, os, asyncio
+# scripts/load_sample.py
+# Bulk import of product files into Mongo. Rows are streamed from JSON arrays, NDJSON and
+# CSV (what scripts/export_sample.py writes and what the scraper drops in data/out/ when
+# Mongo is down), validated against api/schemas.py::ProductIn, and upserted with
+# unordered bulk_write batches by several workers in parallel.
+#
+#   python -m scripts.load_sample                                   # sample_data/products.sample.json
+#   python -m scripts.load_sample samples/data_sample.ndjson data/out/ --workers 8
+#   python -m scripts.load_sample exports/catalogue.csv --rejects rejects.ndjson
+#
+# Same identity as the scraper: (source, asin), or (title, source) for rows without an asin.
+
+import os, csv, glob, json, time, asyncio
+from typing import Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from api.schemas import ProductIn
 from common.db import get_collection
+from common.asin import asin_from_url
+from common.indexes import ensure_all_indexes
+from common.history import record_changes
+from common.leaderboard import rebuild_all
+from common.version import bump_version
+
 SAMPLE = os.path.join(os.path.dirname(__file__), "..", "sample_data", "products.sample.json")
-async def main():
-    col = get_collection()
-    with open(SAMPLE, "r", encoding="utf-8") as f:
-        docs = json.load(f)
-    for d in docs:
-        await col.update_one({"title": d["title"], "source": d.get("source","sample")},
-                             {"$set": d}, upsert=True)
-    count = await col.count_documents({})
+BATCH   = int(os.getenv("LOAD_BATCH", "1000"))
+WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+DEFAULT_SOURCE = "sample"
+EXTENSIONS = (".json", ".ndjson", ".jsonl", ".csv")
+
+def expand(paths: List[str]) -> List[str]:
+    """Files as given; directories and globs expanded to the loadable files inside."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out += sorted(f for f in glob.glob(os.path.join(p, "*")) if f.endswith(EXTENSIONS))
+        elif any(ch in p for ch in "*?["):
+            out += sorted(glob.glob(p))
+        else:
+            out.append(p)
+    return out
+
+def read_rows(path: str) -> Iterator[Tuple[str, object]]:
+    """Yield (where, raw row). JSON arrays are parsed per file; NDJSON and CSV line by line."""
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for i, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield f"{path}:{i}", json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield f"{path}:{i}", e
+    elif path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for i, row in enumerate(csv.DictReader(f), 2):
+                yield f"{path}:{i}", {k: (v if v != "" else None) for k, v in row.items()}
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for i, row in enumerate(data if isinstance(data, list) else [data]):
+            yield f"{path}[{i}]", row
+
+def validate(raw) -> Dict:
+    if isinstance(raw, Exception):
+        raise ValueError(str(raw))
+    # Only the fields the row has: they become the $set, so a partial row (e.g. an export
+    # with --fields) must not null out what is already stored.
+    doc = ProductIn.model_validate(raw).model_dump(exclude_unset=True)
+    asin = doc.pop("asin", None) or asin_from_url(doc.get("product_link"))
+    if asin:
+        doc["asin"] = asin
+    doc["source"] = doc.get("source") or DEFAULT_SOURCE
+    return doc
+
+def _key(d: Dict) -> Dict:
+    if d.get("asin"):
+        return {"source": d["source"], "asin": d["asin"]}
+    return {"title": d["title"], "source": d["source"]}
+
+class Loader:
+    def __init__(self, batch: int = BATCH, workers: int = WORKERS, rejects: Optional[str] = None):
+        self.batch = max(1, batch)
+        self.workers = max(1, workers)
+        self.rejects_path = rejects
+        self.read = self.loaded = self.changed = self.rejected = 0
+        self.errors: List[Tuple[str, str]] = []
+
+    def _reject(self, where: str, err: str):
+        self.rejected += 1
+        self.errors.append((where, err))
+
+    def _batches(self, paths: List[str]) -> Iterator[List[Dict]]:
+        batch = []
+        for path in paths:
+            try:
+                for where, raw in read_rows(path):
+                    self.read += 1
+                    try:
+                        batch.append(validate(raw))
+                    except ValidationError as e:
+                        self._reject(where, "; ".join(f"{'.'.join(map(str, x['loc']))}: {x['msg']}"
+                                                      for x in e.errors()))
+                    except ValueError as e:
+                        self._reject(where, str(e))
+                    if len(batch) >= self.batch:
+                        yield batch
+                        batch = []
+            except (OSError, json.JSONDecodeError) as e:
+                self._reject(path, f"unreadable: {e}")
+        if batch:
+            yield batch
+
+    async def _write(self, col, docs: List[Dict]):
+        await record_changes(docs, products=col)
+        ops = [UpdateOne(_key(d), {"$set": d}, upsert=True) for d in docs]
+        try:
+            res = await col.bulk_write(ops, ordered=False)
+            upserted, modified, failed = res.upserted_count, res.modified_count, []
+        except BulkWriteError as e:
+            d = e.details
+            upserted, modified, failed = d.get("nUpserted", 0), d.get("nModified", 0), d.get("writeErrors", [])
+        for err in failed:
+            doc = docs[err["index"]]
+            self._reject(doc.get("asin") or doc["title"], err.get("errmsg", "write error"))
+        self.loaded += len(docs) - len(failed)
+        self.changed += (upserted or 0) + (modified or 0)
+
+    async def _worker(self, col, queue: asyncio.Queue):
+        while (docs := await queue.get()) is not None:
+            await self._write(col, docs)
+
+    async def run(self, paths: List[str]) -> "Loader":
+        col = get_collection()
+        await ensure_all_indexes()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self._worker(col, queue)) for _ in range(self.workers)]
+        it = self._batches(paths)
+        t0 = time.perf_counter()
+        # File reading and validation run in a thread, overlapping the workers' round trips.
+        while (docs := await asyncio.to_thread(next, it, None)) is not None:
+            await queue.put(docs)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        self.secs = time.perf_counter() - t0
+        if self.changed:
+            await rebuild_all()   # bulk loads bypass the incremental leaderboard merge
+            await bump_version()
+        if self.rejects_path and self.errors:
+            with open(self.rejects_path, "w", encoding="utf-8") as f:
+                for where, err in self.errors:
+                    f.write(json.dumps({"where": where, "error": err}, ensure_ascii=False) + "\n")
+        return self
+
+    def report(self):
+        rate = self.loaded / self.secs if self.secs else 0
+        print(f"Read {self.read} rows: {self.loaded} loaded ({self.changed} inserted/changed), "
+              f"{self.rejected} rejected in {self.secs:.2f}s ({rate:,.0f} rows/s)")
+        for where, err in self.errors[:10]:
+            print(f"  ⚠️ {where}: {err}")
+        if len(self.errors) > 10:
+            print(f"  ... {len(self.errors) - 10} more" + (f" (see {self.rejects_path})" if self.rejects_path else ""))
+
+async def main(paths: Optional[List[str]] = None, batch: int = BATCH, workers: int = WORKERS,
+               rejects: Optional[str] = None):
+    loader = await Loader(batch, workers, rejects).run(expand(paths or [SAMPLE]))
+    loader.report()
+    count = await get_collection().estimated_document_count()
     print(f"Collection now has {count} documents.")
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", help="files, directories or globs (default: the bundled sample)")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rejects", default=None, help="write rejected rows (location + reason) as NDJSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.paths, args.batch, args.workers, args.rejects))